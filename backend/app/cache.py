@@ -0,0 +1,111 @@
+"""
+Shared Redis connection and cache helpers
+Redis is optional: everything Redis-backed here is a no-op when REDIS_URL
+is not set
+"""
+
+from typing import Optional
+import asyncio
+import logging
+
+from cachetools import TTLCache
+from redis.asyncio import Redis
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+_redis: Optional[Redis] = None
+
+# Seconds a location's latest-data snapshot is served from the cache
+LATEST_DATA_TTL_SECONDS = 20
+
+# Current-AQI responses per location_id, local to each process. Readings
+# arrive every DATA_FETCH_INTERVAL_MINUTES, so a short TTL skips the DB on
+# most hits; entries are dropped whenever new readings are stored.
+current_aqi_cache: TTLCache = TTLCache(maxsize=1024, ttl=300)
+
+# Pause before resubscribing after the readings subscription fails
+RESUBSCRIBE_DELAY_SECONDS = 5
+
+
+def get_redis() -> Optional[Redis]:
+    """Shared Redis client, created on first use; None if not configured"""
+    global _redis
+    if _redis is None and settings.REDIS_URL:
+        _redis = Redis.from_url(settings.REDIS_URL, decode_responses=True)
+    return _redis
+
+
+async def close_redis():
+    """Close the shared Redis client"""
+    global _redis
+    if _redis is not None:
+        await _redis.aclose()
+        _redis = None
+
+
+def latest_data_key(location_id: int) -> str:
+    """Cache key of a location's latest-data snapshot"""
+    return f"latest:{location_id}"
+
+
+def readings_channel(location_id: int) -> str:
+    """Pub/sub channel announcing new readings for a location"""
+    return f"aqi:{location_id}"
+
+
+# Matches every readings_channel()
+READINGS_CHANNEL_PATTERN = "aqi:*"
+
+
+def invalidate_current_aqi(*location_ids: int) -> None:
+    """Drop cached current-AQI responses for locations"""
+    for location_id in location_ids:
+        current_aqi_cache.pop(location_id, None)
+
+
+async def notify_new_readings(*location_ids: int):
+    """
+    Drop cached current-AQI responses and latest-data snapshots, and
+    announce new readings to websocket broadcasters and other processes,
+    e.g. after readings are stored
+    """
+    invalidate_current_aqi(*location_ids)
+    
+    redis = get_redis()
+    if redis is None or not location_ids:
+        return
+    
+    try:
+        async with redis.pipeline(transaction=False) as pipe:
+            pipe.delete(*(latest_data_key(location_id) for location_id in location_ids))
+            for location_id in location_ids:
+                pipe.publish(readings_channel(location_id), "1")
+            await pipe.execute()
+    except Exception as e:
+        logger.warning(f"Failed to notify new readings: {e}")
+
+
+async def invalidate_on_new_readings():
+    """
+    Drop local current-AQI responses when any process (e.g. the fetch
+    worker) announces new readings. Runs until cancelled.
+    """
+    redis = get_redis()
+    if redis is None:
+        return
+    
+    while True:
+        pubsub = redis.pubsub(ignore_subscribe_messages=True)
+        try:
+            await pubsub.psubscribe(READINGS_CHANNEL_PATTERN)
+            async for message in pubsub.listen():
+                invalidate_current_aqi(int(message["channel"].rsplit(":", 1)[1]))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Readings subscription failed, retrying: {e}")
+            await asyncio.sleep(RESUBSCRIBE_DELAY_SECONDS)
+        finally:
+            await pubsub.aclose()
@@ -3,7 +3,7 @@ Configuration settings for the AQI Prediction System
 Uses Pydantic Settings for environment variable management
 """
 
-from pydantic_settings import BaseSettings
+from pydantic_settings import BaseSettings, SettingsConfigDict
 from functools import lru_cache
 from typing import Optional
 import os
@@ -11,6 +11,7 @@ import os
 
 class Settings(BaseSettings):
     """Application settings loaded from environment variables"""
+    model_config = SettingsConfigDict(env_file=".env", case_sensitive=True)
     
     # Application
     APP_NAME: str = "Real-Time AQI Prediction System"
@@ -19,10 +20,22 @@ class Settings(BaseSettings):
     
     # Database
     DATABASE_URL: str = "postgresql+asyncpg://localhost/aqi_db"
+    ENABLE_TIMESCALEDB: bool = False  # Store time series as TimescaleDB hypertables
+    DB_POOL_SIZE: int = 20
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT_SECONDS: int = 30
+    DB_POOL_RECYCLE_SECONDS: int = 1800
+    DB_STATEMENT_CACHE_SIZE: int = 512  # asyncpg prepared statements per connection
+    
+    # Redis (optional): enables queued AQI fetches processed by app.worker
+    # and websocket updates pushed as soon as new readings are stored
+    REDIS_URL: Optional[str] = None
     
     # External APIs
     OPENWEATHERMAP_API_KEY: str = ""
     AQICN_API_TOKEN: Optional[str] = None
+    # Cap on locations fetched at once, to limit pressure on the APIs
+    MAX_CONCURRENT_FETCHES: int = 10
     
     # CORS
     CORS_ORIGINS: str = "http://localhost:5173,http://localhost:3000"
@@ -44,10 +57,6 @@ class Settings(BaseSettings):
     def cors_origins_list(self) -> list[str]:
         """Parse CORS origins from comma-separated string"""
         return [origin.strip() for origin in self.CORS_ORIGINS.split(",")]
-    
-    class Config:
-        env_file = ".env"
-        case_sensitive = True
 
 
 @lru_cache()
@@ -5,16 +5,60 @@ Uses async SQLAlchemy with PostgreSQL
 
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import declarative_base
-from sqlalchemy.pool import NullPool
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy import Insert, Result, Table, case, event, insert, inspect, text, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from typing import Any, Optional, Sequence
+import asyncio
+import logging
 from app.config import settings
 
-# Create async engine
+logger = logging.getLogger(__name__)
+
+IS_SQLITE = settings.DATABASE_URL.startswith("sqlite")
+IS_ASYNCPG = settings.DATABASE_URL.startswith("postgresql+asyncpg")
+
+# Applied to every new SQLite connection: WAL lets readers run alongside
+# the writer, and the page cache / mmap keep hot pages resident for the
+# lifetime of the pooled connection
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-65536",  # 64 MiB
+    "PRAGMA mmap_size=268435456",  # 256 MiB
+    "PRAGMA temp_store=MEMORY",
+)
+
+# Create async engine with a pool of long-lived connections, shared by
+# request handlers, websocket broadcasters and background jobs; reusing
+# connections avoids a TCP/TLS/auth handshake per session
 engine = create_async_engine(
     settings.DATABASE_URL,
     echo=settings.DEBUG,
-    poolclass=NullPool,  # Recommended for async
+    poolclass=AsyncAdaptedQueuePool,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_timeout=settings.DB_POOL_TIMEOUT_SECONDS,
+    pool_recycle=settings.DB_POOL_RECYCLE_SECONDS,
+    pool_pre_ping=True,
+    # Per-connection caches of prepared statements, so repeated queries
+    # skip Parse on the server and statement preparation in the dialect
+    connect_args={
+        "prepared_statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+        "statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+    } if IS_ASYNCPG else {},
 )
 
+
+if IS_SQLITE:
+    @event.listens_for(engine.sync_engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in SQLITE_PRAGMAS:
+            cursor.execute(pragma)
+        cursor.close()
+
 # Session factory
 async_session_maker = async_sessionmaker(
     engine,
@@ -44,10 +88,296 @@ async def get_db() -> AsyncSession:
             await session.close()
 
 
+def get_session_factory() -> async_sessionmaker:
+    """
+    Dependency injection for the session factory.
+    
+    For handlers that must not hold a connection across slow non-DB work
+    (e.g. external API calls): open short-lived sessions around each
+    database step instead of one request-wide session.
+    """
+    return async_session_maker
+
+
+async def execute_concurrently(*statements, params: Optional[dict] = None) -> list[Result]:
+    """
+    Run independent read-only statements concurrently.
+    
+    Each statement gets its own short-lived session (and pooled
+    connection), since a single connection cannot run queries in
+    parallel. The same bound parameters are passed to every statement.
+    Results are fully buffered, so they remain usable after the
+    sessions close.
+    """
+    async def run(statement) -> Result:
+        async with async_session_maker() as session:
+            return await session.execute(statement, params)
+    
+    return await asyncio.gather(*(run(statement) for statement in statements))
+
+
+async def uses_asyncpg(session: AsyncSession) -> bool:
+    """Whether the session is backed by the asyncpg driver"""
+    connection = await session.connection()
+    return connection.dialect.driver == "asyncpg"
+
+
+async def get_driver_connection(session: AsyncSession) -> Any:
+    """
+    Return the raw asyncpg connection behind a session.
+    
+    The asyncpg adapter only begins its transaction on the first statement
+    executed through the session, so one is run here if needed. Statements
+    run on the returned connection then share the session's transaction
+    and are committed or rolled back with it; without that they would
+    autocommit, and a server-side cursor could not be opened at all.
+    """
+    connection = await session.connection()
+    raw_connection = await connection.get_raw_connection()
+    driver_connection = raw_connection.driver_connection
+    if not driver_connection.is_in_transaction():
+        await connection.exec_driver_sql("SELECT 1")
+    return driver_connection
+
+
+def insert_ignoring_conflicts(table: Table, conflict_columns: Sequence[str]) -> Insert:
+    """INSERT that silently skips rows violating the unique key on conflict_columns"""
+    dialect_insert = sqlite_insert if IS_SQLITE else pg_insert
+    return dialect_insert(table).on_conflict_do_nothing(index_elements=list(conflict_columns))
+
+
+async def copy_records(
+    session: AsyncSession,
+    table: Table,
+    columns: Sequence[str],
+    records: Sequence[tuple],
+    conflict_columns: Optional[Sequence[str]] = None,
+) -> None:
+    """
+    Bulk-load records into a table within the session's transaction.
+    
+    Uses PostgreSQL COPY on asyncpg and falls back to an executemany
+    insert on other drivers. The caller is responsible for committing.
+    
+    With conflict_columns, records that collide with existing rows on that
+    unique key are skipped; COPY cannot skip rows itself, so on asyncpg the
+    records go through a temporary staging table.
+    """
+    if not records:
+        return
+    
+    if await uses_asyncpg(session):
+        driver_connection = await get_driver_connection(session)
+        column_list = ", ".join(columns)
+        
+        if conflict_columns is None:
+            await driver_connection.copy_records_to_table(
+                table.name,
+                records=records,
+                columns=list(columns),
+            )
+            return
+        
+        # The staging table only exists within the session's transaction,
+        # which get_driver_connection has opened
+        staging = f"{table.name}_staging"
+        await driver_connection.execute(
+            f"CREATE TEMP TABLE {staging} ON COMMIT DROP AS "
+            f"SELECT {column_list} FROM {table.name} WITH NO DATA"
+        )
+        await driver_connection.copy_records_to_table(
+            staging,
+            records=records,
+            columns=list(columns),
+        )
+        await driver_connection.execute(
+            f"INSERT INTO {table.name} ({column_list}) "
+            f"SELECT {column_list} FROM {staging} "
+            f"ON CONFLICT ({', '.join(conflict_columns)}) DO NOTHING"
+        )
+        await driver_connection.execute(f"DROP TABLE {staging}")
+    else:
+        stmt = (
+            insert(table) if conflict_columns is None
+            else insert_ignoring_conflicts(table, conflict_columns)
+        )
+        await session.execute(stmt, [dict(zip(columns, record)) for record in records])
+
+
+def _create_missing_indexes(connection) -> None:
+    """Create indexes declared on models that are missing from existing tables"""
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
+
+
+# Index replaced by the unique uq_aqi_loc_recorded on existing databases
+LEGACY_READING_INDEX = "ix_aqi_loc_recorded"
+
+
+async def _dedupe_aqi_readings(conn) -> None:
+    """
+    Before the unique (location_id, recorded_at) index is first created,
+    delete duplicate readings (keeping the earliest row of each) and drop
+    the non-unique index it replaces.
+    """
+    index_names = await conn.run_sync(
+        lambda sync_conn: {index["name"] for index in inspect(sync_conn).get_indexes("aqi_readings")}
+    )
+    if "uq_aqi_loc_recorded" in index_names:
+        return
+    
+    await conn.execute(text(
+        "DELETE FROM aqi_readings WHERE id NOT IN ("
+        "SELECT MIN(id) FROM aqi_readings GROUP BY location_id, recorded_at)"
+    ))
+    await conn.execute(text(f"DROP INDEX IF EXISTS {LEGACY_READING_INDEX}"))
+
+
+# Lowest location id per set of coordinates; the one duplicates merge into
+KEPT_LOCATION_IDS = "SELECT MIN(id) FROM locations GROUP BY latitude, longitude"
+
+
+async def _dedupe_locations(conn) -> None:
+    """
+    Before the unique (latitude, longitude) index is first created, merge
+    locations sharing coordinates into the one with the lowest id: their
+    readings and predictions move to it, except readings whose timestamp
+    that location already has, which are deleted.
+    """
+    index_names = await conn.run_sync(
+        lambda sync_conn: {index["name"] for index in inspect(sync_conn).get_indexes("locations")}
+    )
+    if "uq_locations_coords" in index_names:
+        return
+    
+    result = await conn.execute(text(
+        "SELECT 1 FROM locations GROUP BY latitude, longitude HAVING COUNT(*) > 1"
+    ))
+    if result.first() is None:
+        return
+    
+    # Kept location of the row's location_id
+    kept_id = (
+        "(SELECT MIN(kept.id) FROM locations merged JOIN locations kept "
+        "ON kept.latitude = merged.latitude AND kept.longitude = merged.longitude "
+        "WHERE merged.id = {table}.location_id)"
+    )
+    
+    # A merged reading survives only if no reading of the kept location,
+    # or earlier reading of another merged location, has its timestamp
+    await conn.execute(text(
+        f"DELETE FROM aqi_readings WHERE location_id NOT IN ({KEPT_LOCATION_IDS}) "
+        "AND EXISTS (SELECT 1 FROM aqi_readings other "
+        "JOIN locations other_location ON other_location.id = other.location_id "
+        "JOIN locations own_location ON own_location.id = aqi_readings.location_id "
+        "WHERE other_location.latitude = own_location.latitude "
+        "AND other_location.longitude = own_location.longitude "
+        "AND other.recorded_at = aqi_readings.recorded_at "
+        "AND other.id <> aqi_readings.id "
+        f"AND (other.location_id IN ({KEPT_LOCATION_IDS}) OR other.id < aqi_readings.id))"
+    ))
+    for table in ("aqi_readings", "predictions"):
+        await conn.execute(text(
+            f"UPDATE {table} SET location_id = {kept_id.format(table=table)} "
+            f"WHERE location_id NOT IN ({KEPT_LOCATION_IDS})"
+        ))
+    result = await conn.execute(text(
+        f"DELETE FROM locations WHERE id NOT IN ({KEPT_LOCATION_IDS})"
+    ))
+    logger.warning(f"Merged {result.rowcount} locations with duplicate coordinates")
+
+
+async def _backfill_aqi_categories(conn) -> None:
+    """
+    Fill in aqi_category for readings stored before it was required,
+    then enforce NOT NULL on existing PostgreSQL tables. Skipped once the
+    column is NOT NULL, so the table is only scanned and locked once.
+    """
+    from app.models.aqi_reading import AQIReading, AQI_THRESHOLDS, AQI_CATEGORIES
+    
+    columns = await conn.run_sync(
+        lambda sync_conn: {column["name"]: column for column in inspect(sync_conn).get_columns("aqi_readings")}
+    )
+    if not columns["aqi_category"]["nullable"]:
+        return
+    
+    category = case(
+        *[
+            (AQIReading.aqi_value <= threshold, name)
+            for threshold, name in zip(AQI_THRESHOLDS, AQI_CATEGORIES)
+        ],
+        else_=AQI_CATEGORIES[-1]
+    )
+    await conn.execute(
+        update(AQIReading.__table__)
+        .where(AQIReading.aqi_category.is_(None))
+        .values(aqi_category=category)
+    )
+    
+    if conn.dialect.name == "postgresql":
+        await conn.execute(text(
+            "ALTER TABLE aqi_readings ALTER COLUMN aqi_category SET NOT NULL"
+        ))
+
+
+# Time-series tables converted to hypertables: table -> partitioning column
+HYPERTABLES = {
+    "aqi_readings": "recorded_at",
+    "predictions": "prediction_for",
+}
+
+
+async def _setup_timescaledb(conn) -> None:
+    """
+    Convert time-series tables into compressed TimescaleDB hypertables.
+    
+    Chunks are one day wide so time-window queries only touch the chunks
+    they need; chunks older than 7 days are compressed, segmented by
+    location. Safe to run on every startup.
+    """
+    await conn.execute(text("CREATE EXTENSION IF NOT EXISTS timescaledb"))
+    
+    for table, time_column in HYPERTABLES.items():
+        result = await conn.execute(
+            text(
+                "SELECT 1 FROM timescaledb_information.hypertables "
+                "WHERE hypertable_name = :table"
+            ),
+            {"table": table}
+        )
+        if result.first():
+            continue
+        
+        # Unique constraints on a hypertable must include the partitioning column
+        await conn.execute(text(f"ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {table}_pkey"))
+        await conn.execute(text(f"ALTER TABLE {table} ADD PRIMARY KEY (id, {time_column})"))
+        
+        await conn.execute(text(
+            f"SELECT create_hypertable('{table}', '{time_column}', "
+            "chunk_time_interval => INTERVAL '1 day', "
+            "migrate_data => TRUE, if_not_exists => TRUE)"
+        ))
+        await conn.execute(text(
+            f"ALTER TABLE {table} SET (timescaledb.compress, "
+            "timescaledb.compress_segmentby = 'location_id')"
+        ))
+        await conn.execute(text(
+            f"SELECT add_compression_policy('{table}', INTERVAL '7 days', if_not_exists => TRUE)"
+        ))
+
+
 async def init_db():
-    """Initialize database tables"""
+    """Initialize database tables and indexes"""
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await _dedupe_aqi_readings(conn)
+        await _dedupe_locations(conn)
+        await conn.run_sync(_create_missing_indexes)
+        await _backfill_aqi_categories(conn)
+        
+        if settings.ENABLE_TIMESCALEDB:
+            await _setup_timescaledb(conn)
 
 
 async def close_db():
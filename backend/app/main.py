@@ -10,14 +10,20 @@ FastAPI backend with:
 
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
 from contextlib import asynccontextmanager
+from logging.handlers import QueueHandler, QueueListener
+import asyncio
 import logging
+import queue
 import sys
 
 from app.config import settings
 from app.database import init_db, close_db
+from app.cache import close_redis, invalidate_on_new_readings
 from app.services.scheduler import scheduler_service
+from app.services.aqi_fetcher import aqi_fetcher
+from app.ml.predictor import predictor_service
 from app.routers import (
     aqi_router,
     predictions_router,
@@ -43,6 +49,14 @@ async def lifespan(app: FastAPI):
     Handles startup and shutdown events.
     """
     # Startup
+    # While serving, handlers write from a listener thread; code on the
+    # event loop only enqueues records instead of blocking on stream I/O
+    root_logger = logging.getLogger()
+    log_handlers = root_logger.handlers
+    log_listener = QueueListener(queue.SimpleQueue(), *log_handlers, respect_handler_level=True)
+    root_logger.handlers = [QueueHandler(log_listener.queue)]
+    log_listener.start()
+    
     logger.info(f"Starting {settings.APP_NAME} v{settings.APP_VERSION}")
     
     try:
@@ -50,6 +64,12 @@ async def lifespan(app: FastAPI):
         await init_db()
         logger.info("Database initialized")
         
+        # Open shared HTTP client for external AQI APIs
+        await aqi_fetcher.startup()
+        
+        # Keep cached current AQI in step with readings stored elsewhere
+        cache_invalidator = asyncio.create_task(invalidate_on_new_readings())
+        
         # Start background scheduler
         scheduler_service.start()
         logger.info("Background scheduler started")
@@ -60,6 +80,8 @@ async def lifespan(app: FastAPI):
         
     except Exception as e:
         logger.error(f"Startup error: {e}")
+        log_listener.stop()
+        root_logger.handlers = log_handlers
         raise
     
     yield
@@ -72,12 +94,25 @@ async def lifespan(app: FastAPI):
         scheduler_service.stop()
         logger.info("Scheduler stopped")
         
+        cache_invalidator.cancel()
+        
+        # Stop model training worker
+        predictor_service.close()
+        
+        # Close shared HTTP client
+        await aqi_fetcher.close()
+        await close_redis()
+        
         # Close database connections
         await close_db()
         logger.info("Database connections closed")
         
     except Exception as e:
         logger.error(f"Shutdown error: {e}")
+    
+    # Flush queued log records and write directly again
+    log_listener.stop()
+    root_logger.handlers = log_handlers
 
 
 # Create FastAPI application
@@ -108,6 +143,7 @@ app = FastAPI(
     """,
     version=settings.APP_VERSION,
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
     docs_url="/docs",
     redoc_url="/redoc",
 )
@@ -127,7 +163,7 @@ app.add_middleware(
 async def global_exception_handler(request: Request, exc: Exception):
     """Global exception handler for unhandled errors"""
     logger.error(f"Unhandled exception: {exc}", exc_info=True)
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=500,
         content={
             "error": "Internal server error",
@@ -210,5 +246,9 @@ if __name__ == "__main__":
         "app.main:app",
         host="0.0.0.0",
         port=8000,
-        reload=settings.DEBUG
+        reload=settings.DEBUG,
+        loop="uvloop",
+        http="httptools",
+        ws="websockets",
+        ws_per_message_deflate=False
     )
@@ -15,6 +15,7 @@ Wang, X. et al. (2018). GA-KELM: Genetic-Algorithm-Improved Kernel
 Extreme Learning Machine for Traffic Flow Forecasting. Electronics.
 """
 
+import copy
 import numpy as np
 import joblib
 from datetime import datetime
@@ -169,12 +170,18 @@ class GAKELM:
         
         logger.info(f"Training samples: {len(X_train)}, Validation samples: {len(X_val)}")
         
+        # The GA only ranks candidates, so its many trial fits run in
+        # float32 (half the memory traffic); the final model uses float64
+        X_train_32 = X_train.astype(np.float32)
+        y_train_32 = y_train.astype(np.float32)
+        X_val_32 = X_val.astype(np.float32)
+        
         # Define fitness function for GA
         def fitness_function(C: float, gamma: float) -> float:
             """Evaluate KELM with given hyperparameters"""
-            kelm = KELM(C=C, gamma=gamma, kernel='rbf')
-            kelm.fit(X_train, y_train)
-            y_pred = kelm.predict(X_val)
+            kelm = KELM(C=C, gamma=gamma, kernel='rbf', dtype=np.float32)
+            kelm.fit(X_train_32, y_train_32)
+            y_pred = kelm.predict(X_val_32)
             
             # Return negative MSE (GA maximizes fitness)
             mse = np.mean((y_val - y_pred) ** 2)
@@ -278,6 +285,31 @@ class GAKELM:
         
         return predictions, confidence
     
+    def predict_step(self, x: np.ndarray) -> Tuple[float, float]:
+        """
+        Predict a single feature vector with its confidence.
+        
+        Equivalent to predict_with_confidence() on one sample, but scales
+        the vector directly and computes the distances to the training
+        data once for both the prediction and the confidence score.
+        
+        Args:
+            x: Input features (n_features,)
+            
+        Returns:
+            Tuple of (prediction, confidence)
+        """
+        if not self._is_fitted:
+            raise RuntimeError("Model must be fitted before prediction")
+        
+        x_scaled = (np.asarray(x, dtype=np.float64) - self.scaler_X.mean_) / self.scaler_X.scale_
+        y_scaled, min_sq_dist = self.kelm.predict_one(x_scaled)
+        
+        prediction = y_scaled * self.scaler_y.scale_[0] + self.scaler_y.mean_[0]
+        confidence = min(max(np.exp(-0.1 * min_sq_dist), 0.5), 1.0)  # Min 50% confidence
+        
+        return float(prediction), float(confidence)
+    
     def get_metrics(self) -> Dict[str, Any]:
         """Get training metrics"""
         return {
@@ -293,10 +325,17 @@ class GAKELM:
             'population_size': self.population_size,
         }
     
+    def compact(self) -> 'GAKELM':
+        """Copy for saving, with the KELM training samples stored as float32"""
+        compact = copy.copy(self)
+        if self.kelm is not None:
+            compact.kelm = self.kelm.compact()
+        return compact
+    
     def save(self, filepath: str) -> None:
         """Save model to file"""
         model_data = {
-            'kelm': self.kelm,
+            'kelm': self.kelm.compact() if self.kelm is not None else None,
             'scaler_X': self.scaler_X,
             'scaler_y': self.scaler_y,
             'best_C': self.best_C,
@@ -398,12 +437,14 @@ def create_lag_features(
     Returns:
         Tuple of (features, valid_indices)
     """
+    values = np.asarray(values)
     n = len(values)
     max_lag = max(lags)
     
-    features = []
-    for i in range(max_lag, n):
-        lag_features = [values[i - lag] for lag in lags]
-        features.append(lag_features)
+    if n <= max_lag:
+        return np.empty((0, len(lags)), dtype=values.dtype), np.arange(0)
+    
+    # Column j holds values[i - lags[j]] for every valid index i
+    features = np.column_stack([values[max_lag - lag:n - lag] for lag in lags])
     
-    return np.array(features), np.arange(max_lag, n)
+    return features, np.arange(max_lag, n)
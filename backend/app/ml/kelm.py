@@ -12,9 +12,10 @@ multiclass classification. IEEE Transactions on Systems, Man, and
 Cybernetics, Part B (Cybernetics), 42(2), 513-529.
 """
 
+import copy
 import numpy as np
 from scipy import linalg
-from typing import Optional, Literal
+from typing import Optional, Literal, Tuple
 
 
 class KELM:
@@ -36,6 +37,7 @@ class KELM:
         gamma: float = 0.1,
         kernel: Literal['rbf', 'linear', 'poly'] = 'rbf',
         degree: int = 3,  # For polynomial kernel
+        dtype: type = np.float64,
     ):
         """
         Initialize KELM.
@@ -45,18 +47,57 @@ class KELM:
             gamma: RBF kernel coefficient (0.001 to 10)
             kernel: Kernel type ('rbf', 'linear', 'poly')
             degree: Degree for polynomial kernel
+            dtype: Floating point type used for training; float32 halves
+                memory traffic at reduced precision
         """
         self.C = C
         self.gamma = gamma
         self.kernel = kernel
         self.degree = degree
+        self.dtype = dtype
         
         # Training data (stored for prediction)
         self.X_train: Optional[np.ndarray] = None
+        self._X_train_sq: Optional[np.ndarray] = None  # Cached squared norms
         self.output_weights: Optional[np.ndarray] = None
         self._is_fitted = False
     
-    def _compute_kernel(self, X1: np.ndarray, X2: np.ndarray) -> np.ndarray:
+    def __getstate__(self) -> dict:
+        """Pickle state without the squared-norm cache, which is rebuilt on load"""
+        state = self.__dict__.copy()
+        state['_X_train_sq'] = None
+        return state
+    
+    def compact(self) -> 'KELM':
+        """
+        Copy for saving, with the training samples stored as float32.
+        
+        X_train dominates the serialized size; halving it keeps model
+        blobs small. It is restored as float64 on load. Only saved
+        models are downcast, so a model passed between processes stays
+        exactly as trained.
+        """
+        compact = copy.copy(self)
+        if self.X_train is not None:
+            compact.X_train = self.X_train.astype(np.float32)
+        compact._X_train_sq = None
+        return compact
+    
+    def __setstate__(self, state: dict):
+        """Restore pickled state, rebuilding cached squared norms if absent"""
+        self.__dict__.update(state)
+        self.__dict__.setdefault('dtype', np.float64)  # Models saved before dtype existed
+        if self.X_train is not None:
+            self.X_train = np.asarray(self.X_train, dtype=np.float64)
+            if self.__dict__.get('_X_train_sq') is None:
+                self._X_train_sq = np.sum(self.X_train * self.X_train, axis=1)
+    
+    def _compute_kernel(
+        self,
+        X1: np.ndarray,
+        X2: np.ndarray,
+        X2_sq: Optional[np.ndarray] = None,
+    ) -> np.ndarray:
         """
         Compute kernel matrix K(X1, X2).
         
@@ -65,6 +106,7 @@ class KELM:
         Args:
             X1: First set of samples (n1, features)
             X2: Second set of samples (n2, features)
+            X2_sq: Optional precomputed squared row norms of X2 (n2,)
             
         Returns:
             Kernel matrix of shape (n1, n2)
@@ -72,11 +114,18 @@ class KELM:
         if self.kernel == 'rbf':
             # Efficient RBF kernel computation
             # ||x - y||^2 = ||x||^2 + ||y||^2 - 2 * x.y
-            X1_sq = np.sum(X1 ** 2, axis=1).reshape(-1, 1)
-            X2_sq = np.sum(X2 ** 2, axis=1).reshape(1, -1)
-            sq_dist = X1_sq + X2_sq - 2 * np.dot(X1, X2.T)
-            sq_dist = np.maximum(sq_dist, 0)  # Numerical stability
-            return np.exp(-self.gamma * sq_dist)
+            # Built in a single (n1, n2) buffer to avoid temporaries
+            X1_sq = np.sum(X1 * X1, axis=1)
+            if X2_sq is None:
+                X2_sq = X1_sq if X2 is X1 else np.sum(X2 * X2, axis=1)
+            K = np.dot(X1, X2.T)
+            K *= -2
+            K += X1_sq[:, None]
+            K += X2_sq[None, :]
+            np.maximum(K, 0, out=K)  # Numerical stability
+            K *= -self.gamma
+            np.exp(K, out=K)
+            return K
             
         elif self.kernel == 'linear':
             return np.dot(X1, X2.T)
@@ -105,32 +154,39 @@ class KELM:
         Returns:
             self (fitted model)
         """
-        X = np.asarray(X, dtype=np.float64)
-        y = np.asarray(y, dtype=np.float64)
+        X = np.asarray(X, dtype=self.dtype)
+        y = np.asarray(y, dtype=self.dtype)
         
-        # Store training data for prediction
+        # Store training data and its squared norms for prediction
         self.X_train = X
+        self._X_train_sq = np.sum(X * X, axis=1)
         n_samples = X.shape[0]
         
         # Reshape y if needed
         if y.ndim == 1:
             y = y.reshape(-1, 1)
         
-        # Compute kernel matrix
-        K = self._compute_kernel(X, X)
-        
-        # Add regularization: (K + I/C)
-        regularization = np.eye(n_samples) / self.C
-        K_reg = K + regularization
+        # Compute kernel matrix and add regularization in place: (K + I/C)
+        # Adding to the diagonal directly avoids two extra (n, n) allocations
+        K = self._compute_kernel(X, X, self._X_train_sq)
+        K.flat[::n_samples + 1] += 1.0 / self.C
         
-        # Solve for output weights using Cholesky decomposition
-        # More numerically stable than direct inversion
+        # Solve for output weights with a single LAPACK ?posv call
+        # (Cholesky factorization + triangular solves), which is more
+        # numerically stable than direct inversion
         try:
-            L = linalg.cholesky(K_reg, lower=True)
-            self.output_weights = linalg.cho_solve((L, True), y)
+            self.output_weights = linalg.solve(
+                K, y,
+                assume_a='pos',
+                overwrite_a=True,
+                check_finite=False,
+            )
         except linalg.LinAlgError:
-            # Fallback to pseudo-inverse if Cholesky fails
-            self.output_weights = linalg.lstsq(K_reg, y, lapack_driver='gelsy')[0]
+            # Fallback to pseudo-inverse if Cholesky fails.
+            # The factorization may have overwritten K, so rebuild it.
+            K = self._compute_kernel(X, X, self._X_train_sq)
+            K.flat[::n_samples + 1] += 1.0 / self.C
+            self.output_weights = linalg.lstsq(K, y, lapack_driver='gelsy')[0]
         
         self._is_fitted = True
         return self
@@ -148,16 +204,50 @@ class KELM:
         if not self._is_fitted:
             raise RuntimeError("Model must be fitted before prediction")
             
-        X = np.asarray(X, dtype=np.float64)
+        X = np.asarray(X, dtype=self.X_train.dtype)
         
         # Compute kernel between new samples and training samples
-        K_test = self._compute_kernel(X, self.X_train)
+        K_test = self._compute_kernel(X, self.X_train, self._X_train_sq)
         
         # Predict: y_pred = K_test * beta
         predictions = np.dot(K_test, self.output_weights)
         
         return predictions.ravel()
     
+    def predict_one(self, x: np.ndarray) -> Tuple[float, float]:
+        """
+        Predict a single sample.
+        
+        Specialized path for step-by-step forecasting: computes one row of
+        squared distances to the training set, reuses it for the kernel
+        row, and skips the 2-D broadcasting of predict().
+        
+        Args:
+            x: Input features (n_features,)
+            
+        Returns:
+            Tuple of (prediction, minimum squared distance to X_train)
+        """
+        if not self._is_fitted:
+            raise RuntimeError("Model must be fitted before prediction")
+        
+        # ||x - x_i||^2 for every training sample x_i
+        sq_dist = np.dot(self.X_train, x)
+        sq_dist *= -2
+        sq_dist += self._X_train_sq
+        sq_dist += np.dot(x, x)
+        np.maximum(sq_dist, 0, out=sq_dist)
+        min_sq_dist = float(sq_dist.min())
+        
+        if self.kernel == 'rbf':
+            sq_dist *= -self.gamma
+            k_row = np.exp(sq_dist, out=sq_dist)
+        else:
+            k_row = self._compute_kernel(x.reshape(1, -1), self.X_train, self._X_train_sq)[0]
+        
+        prediction = float(np.dot(k_row, self.output_weights)[0])
+        return prediction, min_sq_dist
+    
     def score(self, X: np.ndarray, y: np.ndarray) -> float:
         """
         Compute R² score for predictions.
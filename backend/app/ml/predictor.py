@@ -7,21 +7,101 @@ Manages:
 - Feature engineering from AQI readings
 """
 
+import asyncio
+import multiprocessing
 import numpy as np
 import joblib
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional, List, Tuple
+from functools import lru_cache
+from typing import Optional, List, Tuple, Dict, Any, Deque, Mapping
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, desc
+from sqlalchemy import bindparam, select, desc
 import logging
 import io
+import sys
 
 from app.ml.ga_kelm import GAKELM, create_time_features, create_lag_features
 from app.models import AQIReading, Prediction, ModelMetadata, Location
 from app.config import settings
+from app.database import uses_asyncpg, get_driver_connection
 
 logger = logging.getLogger(__name__)
 
+# Reading fields prediction needs; rows are used as mappings so in-memory
+# readings (built by reading_store.build_reading_row) work the same way
+RECENT_READING_COLUMNS = (
+    AQIReading.aqi_value,
+    AQIReading.pm25,
+    AQIReading.pm10,
+    AQIReading.o3,
+    AQIReading.no2,
+    AQIReading.recorded_at,
+)
+
+# Columns produced by create_time_features()
+TIME_FEATURE_COUNT = 8
+
+# Statements are built once; values are bound at execute time
+TRAINING_READINGS_STMT = (
+    select(
+        AQIReading.aqi_value,
+        AQIReading.recorded_at,
+        AQIReading.pm25,
+        AQIReading.pm10,
+        AQIReading.o3,
+        AQIReading.no2,
+    )
+    .where(AQIReading.recorded_at >= bindparam("since"))
+    .order_by(AQIReading.recorded_at)
+)
+LOCATION_TRAINING_READINGS_STMT = TRAINING_READINGS_STMT.where(
+    AQIReading.location_id == bindparam("location_id")
+)
+LATEST_MODEL_STMT = (
+    select(ModelMetadata)
+    .order_by(desc(ModelMetadata.trained_at))
+    .limit(1)
+)
+
+# GA-KELM fitting is CPU-bound for minutes; it runs in a worker process so
+# the event loop keeps serving requests and websocket clients meanwhile.
+# Workers are spawned (not forked) to avoid inheriting the loop and its
+# open connections.
+def _init_train_worker():
+    """Configure logging in the training worker like the app does, so GA-KELM progress shows up"""
+    logging.basicConfig(
+        level=logging.INFO if not settings.DEBUG else logging.DEBUG,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+        handlers=[
+            logging.StreamHandler(sys.stdout)
+        ]
+    )
+
+
+_train_pool = ProcessPoolExecutor(
+    max_workers=1,
+    mp_context=multiprocessing.get_context("spawn"),
+    initializer=_init_train_worker,
+)
+
+
+@lru_cache(maxsize=None)
+def _compile(stmt, dialect):
+    """Compile a module-level statement once per dialect (raw driver path)"""
+    return stmt.compile(dialect=dialect)
+
+
+def _fit_model(X: np.ndarray, y: np.ndarray, population_size: int, generations: int) -> GAKELM:
+    """Fit a GA-KELM model; runs in the training worker process"""
+    model = GAKELM(
+        population_size=population_size,
+        generations=generations,
+        random_state=42
+    )
+    model.fit(X, y, verbose=True)
+    return model
+
 
 class PredictorService:
     """
@@ -36,17 +116,111 @@ class PredictorService:
     # Feature configuration
     LAG_HOURS = [1, 2, 3, 6, 12, 24]  # Lag features to use
     
+    # Readings covering the largest lag, newest first
+    RECENT_READINGS_STMT = (
+        select(*RECENT_READING_COLUMNS)
+        .where(AQIReading.location_id == bindparam("location_id"))
+        .order_by(desc(AQIReading.recorded_at))
+        .limit(max(LAG_HOURS) + 1)
+    )
+    
+    # Rows converted to arrays per chunk while loading training data
+    TRAINING_FETCH_BATCH_SIZE = 5000
+    
     def __init__(self):
         self.model: Optional[GAKELM] = None
         self.model_version: str = "1.0.0"
         self._is_loaded = False
     
+    async def _fetch_training_arrays(
+        self,
+        session: AsyncSession,
+        since: datetime,
+        location_id: Optional[int] = None,
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Load training columns as arrays, bypassing ORM object hydration.
+        
+        Args:
+            session: Database session
+            since: Only readings recorded at or after this time are used
+            location_id: Restrict to one location (all locations if None)
+            
+        Returns:
+            Tuple of (aqi_values, time_features, pollution) sorted by time,
+            where time_features are the create_time_features() columns of
+            each reading and pollution has columns (pm25, pm10, o3, no2)
+            with missing values as 0
+        """
+        if location_id is None:
+            stmt, params = TRAINING_READINGS_STMT, {"since": since}
+        else:
+            stmt = LOCATION_TRAINING_READINGS_STMT
+            params = {"since": since, "location_id": location_id}
+        
+        # Rows are streamed and converted a chunk at a time, so the full
+        # result set never exists as row objects at once
+        chunks = [
+            self._rows_to_arrays(rows)
+            async for rows in self._stream_training_rows(session, stmt, params)
+        ]
+        if not chunks:
+            return (
+                np.empty(0, dtype=np.float32),
+                np.empty((0, TIME_FEATURE_COUNT), dtype=np.float32),
+                np.empty((0, 4), dtype=np.float32),
+            )
+        
+        aqi_values = np.concatenate([chunk[0] for chunk in chunks])
+        time_features = np.concatenate([chunk[1] for chunk in chunks])
+        pollution = np.concatenate([chunk[2] for chunk in chunks])
+        
+        return aqi_values, time_features, pollution
+    
+    async def _stream_training_rows(self, session: AsyncSession, stmt, params: Dict[str, Any]):
+        """Yield training rows in batches of TRAINING_FETCH_BATCH_SIZE"""
+        batch_size = self.TRAINING_FETCH_BATCH_SIZE
+        
+        if await uses_asyncpg(session):
+            # Plain asyncpg records from a server-side cursor skip
+            # SQLAlchemy's result processing; the cursor needs the open
+            # transaction get_driver_connection guarantees
+            driver_connection = await get_driver_connection(session)
+            compiled = _compile(stmt, session.bind.dialect)
+            values = compiled.construct_params(params)
+            args = [values[name] for name in compiled.positiontup]
+            cursor = await driver_connection.cursor(str(compiled), *args)
+            while rows := await cursor.fetch(batch_size):
+                yield rows
+        else:
+            result = await session.stream(stmt, params)
+            async for rows in result.partitions(batch_size):
+                yield rows
+    
+    @staticmethod
+    def _rows_to_arrays(rows) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Convert (aqi_value, recorded_at, pm25, pm10, o3, no2) rows to arrays"""
+        n = len(rows)
+        
+        aqi_values = np.fromiter((r[0] for r in rows), dtype=np.float32, count=n)
+        # Timestamps become feature columns per chunk, so datetime objects
+        # for the whole training window are never held at once
+        time_features = create_time_features([r[1] for r in rows]).astype(np.float32)
+        
+        # NULL components become NaN in the float array, then 0
+        pollution = np.array([r[2:] for r in rows], dtype=np.float32).reshape(n, 4)
+        np.nan_to_num(pollution, copy=False)
+        
+        return aqi_values, time_features, pollution
+    
     def _prepare_features(
         self, 
-        readings: List[AQIReading]
+        aqi_values: np.ndarray,
+        time_features: np.ndarray,
+        pollution: np.ndarray,
     ) -> Tuple[np.ndarray, np.ndarray]:
         """
-        Prepare features from AQI readings.
+        Prepare features from AQI reading columns.
         
         Features include:
         - Lagged AQI values
@@ -54,33 +228,19 @@ class PredictorService:
         - Pollution component values
         
         Args:
-            readings: List of AQI readings sorted by time
+            aqi_values: AQI values sorted by time (n,)
+            time_features: Time features of each reading (n, TIME_FEATURE_COUNT)
+            pollution: Pollution components pm25, pm10, o3, no2 (n, 4)
             
         Returns:
             Tuple of (X_features, y_targets)
         """
-        # Extract values and timestamps
-        aqi_values = np.array([r.aqi_value for r in readings])
-        timestamps = [r.recorded_at for r in readings]
-        
         # Create lag features
         lag_features, valid_indices = create_lag_features(aqi_values, self.LAG_HOURS)
         
-        # Create time features for valid indices
-        valid_timestamps = [timestamps[i] for i in valid_indices]
-        time_features = create_time_features(valid_timestamps)
-        
-        # Get pollution components for valid indices
-        pollution_features = []
-        for i in valid_indices:
-            r = readings[i]
-            pollution_features.append([
-                r.pm25 or 0,
-                r.pm10 or 0,
-                r.o3 or 0,
-                r.no2 or 0,
-            ])
-        pollution_features = np.array(pollution_features)
+        # Get time features and pollution components for valid indices
+        time_features = time_features[valid_indices]
+        pollution_features = pollution[valid_indices]
         
         # Combine all features
         X = np.hstack([lag_features, time_features, pollution_features])
@@ -92,16 +252,20 @@ class PredictorService:
     
     async def train_model(
         self, 
-        readings: List[AQIReading],
+        aqi_values: np.ndarray,
+        time_features: np.ndarray,
+        pollution: np.ndarray,
         session: AsyncSession,
         population_size: int = 30,
         generations: int = 50,
     ) -> Optional[GAKELM]:
         """
-        Train GA-KELM model from AQI readings.
+        Train GA-KELM model from AQI reading columns.
         
         Args:
-            readings: List of AQI readings
+            aqi_values: AQI values sorted by time
+            time_features: Time features (see _fetch_training_arrays)
+            pollution: Pollution components (see _fetch_training_arrays)
             session: Database session for saving model
             population_size: GA population size
             generations: GA generations
@@ -109,16 +273,13 @@ class PredictorService:
         Returns:
             Trained model or None if training fails
         """
-        if len(readings) < 100:
+        if len(aqi_values) < 100:
             logger.warning("Not enough data for training (need at least 100 samples)")
             return None
         
         try:
-            # Sort readings by time
-            readings = sorted(readings, key=lambda r: r.recorded_at)
-            
             # Prepare features
-            X, y = self._prepare_features(readings)
+            X, y = self._prepare_features(aqi_values, time_features, pollution)
             
             if len(X) < 50:
                 logger.warning("Not enough valid samples after feature engineering")
@@ -126,13 +287,11 @@ class PredictorService:
             
             logger.info(f"Training with {len(X)} samples, {X.shape[1]} features")
             
-            # Train model
-            self.model = GAKELM(
-                population_size=population_size,
-                generations=generations,
-                random_state=42
+            # Train model in the worker process
+            loop = asyncio.get_running_loop()
+            self.model = await loop.run_in_executor(
+                _train_pool, _fit_model, X, y, population_size, generations
             )
-            self.model.fit(X, y, verbose=True)
             
             # Update version
             self.model_version = f"v{datetime.now().strftime('%Y%m%d_%H%M%S')}"
@@ -147,14 +306,18 @@ class PredictorService:
             logger.error(f"Training failed: {e}")
             return None
     
+    def close(self):
+        """Stop the training worker process"""
+        _train_pool.shutdown(wait=False, cancel_futures=True)
+    
     async def _save_model_to_db(self, session: AsyncSession):
         """Save trained model to database"""
         if not self.model:
             return
         
-        # Serialize model to bytes
+        # Serialize model to bytes (zlib-compressed, X_train stored as float32)
         buffer = io.BytesIO()
-        joblib.dump(self.model, buffer)
+        joblib.dump(self.model.compact(), buffer, compress=3)
         model_bytes = buffer.getvalue()
         
         metrics = self.model.get_metrics()
@@ -184,11 +347,7 @@ class PredictorService:
             True if model loaded successfully
         """
         try:
-            result = await session.execute(
-                select(ModelMetadata)
-                .order_by(desc(ModelMetadata.trained_at))
-                .limit(1)
-            )
+            result = await session.execute(LATEST_MODEL_STMT)
             model_meta = result.scalar_one_or_none()
             
             if not model_meta or not model_meta.model_binary:
@@ -212,8 +371,9 @@ class PredictorService:
         self,
         location_id: int,
         hours_ahead: int,
-        session: AsyncSession
-    ) -> List[Prediction]:
+        session: AsyncSession,
+        recent: Optional[Deque[Mapping[str, Any]]] = None
+    ) -> List[Dict[str, Any]]:
         """
         Generate predictions for future hours.
         
@@ -221,9 +381,14 @@ class PredictorService:
             location_id: Location to predict for
             hours_ahead: Number of hours to predict
             session: Database session
+            recent: Optional in-memory window of the location's latest
+                readings (oldest first). Used instead of querying when it
+                holds enough readings; otherwise it is refilled from the
+                database.
             
         Returns:
-            List of Prediction objects
+            List of prediction rows (dicts keyed by Prediction column names),
+            ready for a bulk insert
         """
         # Load model if not loaded
         if not self._is_loaded:
@@ -236,65 +401,68 @@ class PredictorService:
         try:
             # Get recent readings for the location
             max_lag = max(self.LAG_HOURS)
-            result = await session.execute(
-                select(AQIReading)
-                .where(AQIReading.location_id == location_id)
-                .order_by(desc(AQIReading.recorded_at))
-                .limit(max_lag + 1)
-            )
-            recent_readings = list(result.scalars().all())
+            if recent is not None and len(recent) > max_lag:
+                recent_readings = list(recent)[-(max_lag + 1):]
+            else:
+                result = await session.execute(
+                    self.RECENT_READINGS_STMT, {"location_id": location_id}
+                )
+                # Sort chronologically
+                recent_readings = result.mappings().all()[::-1]
+                if recent is not None:
+                    recent.clear()
+                    recent.extend(recent_readings)
             
             if len(recent_readings) < max_lag:
                 logger.warning("Not enough recent readings for prediction")
                 return []
             
-            # Sort chronologically
-            recent_readings = sorted(recent_readings, key=lambda r: r.recorded_at)
-            
             predictions = []
-            current_values = [r.aqi_value for r in recent_readings]
             last_reading = recent_readings[-1]
-            base_time = last_reading.recorded_at
+            base_time = last_reading["recorded_at"]
             
-            for hour in range(1, hours_ahead + 1):
-                prediction_time = base_time + timedelta(hours=hour)
-                
-                # Create features
-                lag_features = [current_values[-(lag)] for lag in self.LAG_HOURS if lag <= len(current_values)]
-                
-                # Pad if needed
-                while len(lag_features) < len(self.LAG_HOURS):
-                    lag_features.append(lag_features[-1] if lag_features else 50)
-                
-                time_features = create_time_features([prediction_time])[0]
-                
-                # Use last known pollution values
-                pollution_features = [
-                    last_reading.pm25 or 0,
-                    last_reading.pm10 or 0,
-                    last_reading.o3 or 0,
-                    last_reading.no2 or 0,
-                ]
-                
-                # Combine features
-                X = np.array([lag_features + list(time_features) + pollution_features])
+            # Rolling AQI history: observed values followed by predictions
+            n_observed = len(recent_readings)
+            history = np.empty(n_observed + hours_ahead)
+            history[:n_observed] = [r["aqi_value"] for r in recent_readings]
+            lags = np.asarray(self.LAG_HOURS)
+            n_lags = len(lags)
+            
+            # Time features do not depend on predictions, so build them at once
+            prediction_times = [base_time + timedelta(hours=hour) for hour in range(1, hours_ahead + 1)]
+            time_features = create_time_features(prediction_times)
+            n_time = time_features.shape[1]
+            
+            # Preallocated feature vector: [lags | time | pollution]
+            # Pollution uses the last known values for every step
+            x = np.empty(n_lags + n_time + 4)
+            x[n_lags + n_time:] = [
+                last_reading["pm25"] or 0,
+                last_reading["pm10"] or 0,
+                last_reading["o3"] or 0,
+                last_reading["no2"] or 0,
+            ]
+            
+            for step, prediction_time in enumerate(prediction_times):
+                current = n_observed + step
+                x[:n_lags] = history[current - lags]
+                x[n_lags:n_lags + n_time] = time_features[step]
                 
                 # Predict
-                pred_value, confidence = self.model.predict_with_confidence(X)
-                pred_aqi = float(np.clip(pred_value[0], 0, 500))
+                pred_value, confidence = self.model.predict_step(x)
+                pred_aqi = float(np.clip(pred_value, 0, 500))
                 
-                # Create prediction object
-                prediction = Prediction(
-                    location_id=location_id,
-                    predicted_aqi=pred_aqi,
-                    predicted_category=Prediction.get_category(pred_aqi),
-                    confidence=float(confidence[0]),
-                    prediction_for=prediction_time,
-                )
-                predictions.append(prediction)
+                # Create prediction row
+                predictions.append({
+                    "location_id": location_id,
+                    "predicted_aqi": pred_aqi,
+                    "predicted_category": Prediction.get_category(pred_aqi),
+                    "confidence": confidence,
+                    "prediction_for": prediction_time,
+                })
                 
                 # Update values for next prediction
-                current_values.append(pred_aqi)
+                history[current] = pred_aqi
             
             return predictions
             
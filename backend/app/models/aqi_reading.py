@@ -2,10 +2,50 @@
 AQI Reading model for storing air quality measurements
 """
 
-from sqlalchemy import Column, Integer, Float, String, DateTime, ForeignKey, func
+from bisect import bisect_left
+from math import ceil
+from sqlalchemy import Column, Integer, Float, String, DateTime, ForeignKey, Index, func
 from sqlalchemy.orm import relationship
 from app.database import Base
 
+# Upper bound (inclusive) of each AQI category, and the category names;
+# the last category has no upper bound
+AQI_THRESHOLDS = (50, 100, 150, 200, 300)
+AQI_CATEGORIES = (
+    "Good",
+    "Moderate",
+    "Unhealthy for Sensitive Groups",
+    "Unhealthy",
+    "Very Unhealthy",
+    "Hazardous",
+)
+
+
+# Highest value on the AQI scale; anything above is still "Hazardous"
+AQI_MAX = 500
+
+
+def aqi_level(aqi_value: float) -> int:
+    """Index of the AQI category containing a value"""
+    return bisect_left(AQI_THRESHOLDS, aqi_value)
+
+
+# Category for every integer AQI value 0..AQI_MAX, built once at import
+_CATEGORY_TABLE = tuple(AQI_CATEGORIES[aqi_level(value)] for value in range(AQI_MAX + 1))
+
+
+def aqi_table_index(aqi_value: float) -> int:
+    """
+    Index into a per-integer AQI lookup table. Fractional values round
+    up, since category bounds are inclusive integers.
+    """
+    return min(max(ceil(aqi_value), 0), AQI_MAX)
+
+
+def aqi_category(aqi_value: float) -> str:
+    """Determine AQI category based on value"""
+    return _CATEGORY_TABLE[aqi_table_index(aqi_value)]
+
 
 class AQIReading(Base):
     """
@@ -16,7 +56,7 @@ class AQIReading(Base):
     __tablename__ = "aqi_readings"
     
     id = Column(Integer, primary_key=True, index=True)
-    location_id = Column(Integer, ForeignKey("locations.id"), nullable=False, index=True)
+    location_id = Column(Integer, ForeignKey("locations.id"), nullable=False)
     
     # Pollutant concentrations (μg/m³)
     pm25 = Column(Float)  # Fine particulate matter
@@ -28,7 +68,7 @@ class AQIReading(Base):
     
     # Calculated AQI
     aqi_value = Column(Integer, nullable=False, index=True)
-    aqi_category = Column(String(50))  # Good, Moderate, Unhealthy, etc.
+    aqi_category = Column(String(50), nullable=False)  # Good, Moderate, Unhealthy, etc.
     
     # Timestamps
     recorded_at = Column(DateTime(timezone=True), nullable=False, index=True)
@@ -37,21 +77,18 @@ class AQIReading(Base):
     # Relationships
     location = relationship("Location", back_populates="aqi_readings")
     
+    __table_args__ = (
+        # One reading per location and measurement time, so re-fetching an
+        # unchanged upstream measurement never adds a row. Also serves
+        # "latest reading for a location" and per-location time windows
+        # with an index range scan, and lookups by location_id alone.
+        Index("uq_aqi_loc_recorded", location_id, recorded_at, unique=True),
+    )
+    
     def __repr__(self):
         return f"<AQIReading(id={self.id}, aqi={self.aqi_value}, recorded_at='{self.recorded_at}')>"
     
     @staticmethod
     def get_category(aqi_value: int) -> str:
         """Determine AQI category based on value"""
-        if aqi_value <= 50:
-            return "Good"
-        elif aqi_value <= 100:
-            return "Moderate"
-        elif aqi_value <= 150:
-            return "Unhealthy for Sensitive Groups"
-        elif aqi_value <= 200:
-            return "Unhealthy"
-        elif aqi_value <= 300:
-            return "Very Unhealthy"
-        else:
-            return "Hazardous"
+        return aqi_category(aqi_value)
@@ -2,7 +2,7 @@
 Location model for monitoring locations
 """
 
-from sqlalchemy import Column, Integer, String, Float, DateTime, func
+from sqlalchemy import Column, Integer, String, Float, DateTime, Index, func
 from sqlalchemy.orm import relationship
 from app.database import Base
 
@@ -26,5 +26,10 @@ class Location(Base):
     aqi_readings = relationship("AQIReading", back_populates="location", cascade="all, delete-orphan")
     predictions = relationship("Prediction", back_populates="location", cascade="all, delete-orphan")
     
+    __table_args__ = (
+        # A location is identified by its coordinates
+        Index("uq_locations_coords", latitude, longitude, unique=True),
+    )
+    
     def __repr__(self):
         return f"<Location(id={self.id}, city='{self.city}', country='{self.country}')>"
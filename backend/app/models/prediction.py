@@ -2,9 +2,10 @@
 Prediction model for storing GA-KELM AQI predictions
 """
 
-from sqlalchemy import Column, Integer, Float, String, DateTime, ForeignKey, func
+from sqlalchemy import Column, Integer, Float, String, DateTime, ForeignKey, Index, func
 from sqlalchemy.orm import relationship
 from app.database import Base
+from app.models.aqi_reading import aqi_category
 
 
 class Prediction(Base):
@@ -16,7 +17,7 @@ class Prediction(Base):
     __tablename__ = "predictions"
     
     id = Column(Integer, primary_key=True, index=True)
-    location_id = Column(Integer, ForeignKey("locations.id"), nullable=False, index=True)
+    location_id = Column(Integer, ForeignKey("locations.id"), nullable=False)
     
     # Prediction values
     predicted_aqi = Column(Float, nullable=False)
@@ -32,21 +33,15 @@ class Prediction(Base):
     # Relationships
     location = relationship("Location", back_populates="predictions")
     
+    __table_args__ = (
+        # Serves per-location prediction_for range queries
+        Index("ix_predictions_loc_for", location_id, prediction_for),
+    )
+    
     def __repr__(self):
         return f"<Prediction(id={self.id}, aqi={self.predicted_aqi}, for='{self.prediction_for}')>"
     
     @staticmethod
     def get_category(aqi_value: float) -> str:
         """Determine AQI category based on predicted value"""
-        if aqi_value <= 50:
-            return "Good"
-        elif aqi_value <= 100:
-            return "Moderate"
-        elif aqi_value <= 150:
-            return "Unhealthy for Sensitive Groups"
-        elif aqi_value <= 200:
-            return "Unhealthy"
-        elif aqi_value <= 300:
-            return "Very Unhealthy"
-        else:
-            return "Hazardous"
+        return aqi_category(aqi_value)
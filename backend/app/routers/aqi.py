@@ -4,38 +4,135 @@ Endpoints for retrieving AQI data
 """
 
 from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, desc
-from datetime import datetime, timedelta
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy import Row, bindparam, select, desc, func, case
+from datetime import datetime, timedelta, timezone
 from typing import Optional
+import orjson
 
-from app.database import get_db
+from app.cache import current_aqi_cache
+from app.database import execute_concurrently, get_session_factory
 from app.models import Location, AQIReading
 from app.schemas import (
-    AQIReadingResponse, 
     AQICurrentResponse, 
-    AQIHistoryResponse
+    AQIHistoryResponse,
+    AQIBatchFetchRequest,
+    AQIBatchFetchResponse
 )
 from app.services.aqi_fetcher import aqi_fetcher
+from app.services.fetch_queue import fetch_queue
+from app.services.reading_store import build_reading_row, bulk_insert_readings
 
 router = APIRouter(prefix="/aqi", tags=["aqi"])
 
 
+# Location fields used to build current-AQI responses and fetch fresh data
+LOCATION_COLUMNS = (
+    Location.id,
+    Location.city,
+    Location.country,
+    Location.latitude,
+    Location.longitude,
+)
+
+# Columns of AQIReadingResponse, selected directly for history listings
+HISTORY_COLUMNS = (
+    AQIReading.id,
+    AQIReading.location_id,
+    AQIReading.pm25,
+    AQIReading.pm10,
+    AQIReading.o3,
+    AQIReading.no2,
+    AQIReading.so2,
+    AQIReading.co,
+    AQIReading.aqi_value,
+    AQIReading.aqi_category,
+    AQIReading.recorded_at,
+    AQIReading.created_at,
+)
+
+# Rows fetched per round-trip when streaming history
+HISTORY_STREAM_BATCH_SIZE = 500
+
+# Statements are built once at import; per-request values are passed
+# as bound parameters when executing
+LOCATION_STMT = select(*LOCATION_COLUMNS).where(Location.id == bindparam("location_id"))
+
+LATEST_READING_STMT = (
+    select(AQIReading)
+    .where(AQIReading.location_id == bindparam("location_id"))
+    .order_by(desc(AQIReading.recorded_at))
+    .limit(1)
+)
+
+HISTORY_STMT = (
+    select(*HISTORY_COLUMNS)
+    .where(
+        AQIReading.location_id == bindparam("location_id"),
+        AQIReading.recorded_at >= bindparam("cutoff")
+    )
+    .order_by(desc(AQIReading.recorded_at))
+)
+
+# The trend compares the averages of the first and second halves of the window
+STATS_STMT = (
+    select(
+        func.count(AQIReading.aqi_value),
+        func.min(AQIReading.aqi_value),
+        func.max(AQIReading.aqi_value),
+        func.avg(AQIReading.aqi_value),
+        func.avg(case((AQIReading.recorded_at < bindparam("midpoint"), AQIReading.aqi_value))),
+        func.avg(case((AQIReading.recorded_at >= bindparam("midpoint"), AQIReading.aqi_value))),
+    )
+    .where(
+        AQIReading.location_id == bindparam("location_id"),
+        AQIReading.recorded_at >= bindparam("cutoff")
+    )
+)
+
+
+def _current_response_from_row(location: Row, row: dict) -> AQICurrentResponse:
+    """Build a current-AQI response from an inserted reading row"""
+    return AQICurrentResponse(
+        location_id=location.id,
+        city=location.city,
+        country=location.country,
+        aqi_value=row["aqi_value"],
+        aqi_category=row["aqi_category"],
+        pm25=row["pm25"],
+        pm10=row["pm10"],
+        o3=row["o3"],
+        no2=row["no2"],
+        so2=row["so2"],
+        co=row["co"],
+        recorded_at=row["recorded_at"],
+        health_advisory=AQICurrentResponse.get_health_advisory(row["aqi_value"])
+    )
+
+
 @router.get("/current/{location_id}", response_model=AQICurrentResponse)
 async def get_current_aqi(
     location_id: int,
-    db: AsyncSession = Depends(get_db)
+    session_factory: async_sessionmaker = Depends(get_session_factory)
 ):
     """
     Get the current AQI for a specific location.
     
     Returns the most recent AQI reading along with health advisory.
     """
-    # Get location
-    result = await db.execute(
-        select(Location).where(Location.id == location_id)
+    cached = current_aqi_cache.get(location_id)
+    if cached is not None:
+        return cached
+    
+    # Read location and latest reading concurrently; neither holds a
+    # connection during any slow external API call below
+    location_result, reading_result = await execute_concurrently(
+        LOCATION_STMT,
+        LATEST_READING_STMT,
+        params={"location_id": location_id}
     )
-    location = result.scalar_one_or_none()
+    location = location_result.one_or_none()
     
     if not location:
         raise HTTPException(
@@ -43,14 +140,7 @@ async def get_current_aqi(
             detail=f"Location with id {location_id} not found"
         )
     
-    # Get most recent reading
-    result = await db.execute(
-        select(AQIReading)
-        .where(AQIReading.location_id == location_id)
-        .order_by(desc(AQIReading.recorded_at))
-        .limit(1)
-    )
-    reading = result.scalar_one_or_none()
+    reading = reading_result.scalar_one_or_none()
     
     if not reading:
         # Try to fetch fresh data
@@ -59,26 +149,26 @@ async def get_current_aqi(
             location.longitude
         )
         
-        if aqi_data:
-            reading = AQIReading(
-                location_id=location_id,
-                **{k: v for k, v in aqi_data.items() if k != 'source'}
-            )
-            db.add(reading)
-            await db.commit()
-            await db.refresh(reading)
-        else:
+        if not aqi_data:
             raise HTTPException(
                 status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
                 detail="No AQI data available for this location"
             )
+        
+        row = build_reading_row(location_id, aqi_data)
+        async with session_factory() as db:
+            await bulk_insert_readings(db, [row])
+        
+        response = _current_response_from_row(location, row)
+        current_aqi_cache[location_id] = response
+        return response
     
-    return AQICurrentResponse(
+    response = AQICurrentResponse(
         location_id=location.id,
         city=location.city,
         country=location.country,
         aqi_value=reading.aqi_value,
-        aqi_category=reading.aqi_category or AQIReading.get_category(reading.aqi_value),
+        aqi_category=reading.aqi_category,
         pm25=reading.pm25,
         pm10=reading.pm10,
         o3=reading.o3,
@@ -88,13 +178,18 @@ async def get_current_aqi(
         recorded_at=reading.recorded_at,
         health_advisory=AQICurrentResponse.get_health_advisory(reading.aqi_value)
     )
+    current_aqi_cache[location_id] = response
+    return response
 
 
-@router.get("/history/{location_id}", response_model=AQIHistoryResponse)
+@router.get(
+    "/history/{location_id}",
+    response_model=AQIHistoryResponse,
+    response_class=ORJSONResponse
+)
 async def get_aqi_history(
     location_id: int,
-    hours: int = Query(default=24, ge=1, le=720, description="Hours of history to retrieve"),
-    db: AsyncSession = Depends(get_db)
+    hours: int = Query(default=24, ge=1, le=720, description="Hours of history to retrieve")
 ):
     """
     Get historical AQI data for a location.
@@ -102,11 +197,16 @@ async def get_aqi_history(
     - **location_id**: Location ID
     - **hours**: Number of hours of history (1-720, default 24)
     """
-    # Get location
-    result = await db.execute(
-        select(Location).where(Location.id == location_id)
+    # Get location and readings from last N hours concurrently, as plain
+    # rows (no ORM hydration)
+    cutoff = datetime.now(timezone.utc) - timedelta(hours=hours)
+    
+    location_result, result = await execute_concurrently(
+        LOCATION_STMT,
+        HISTORY_STMT,
+        params={"location_id": location_id, "cutoff": cutoff}
     )
-    location = result.scalar_one_or_none()
+    location = location_result.one_or_none()
     
     if not location:
         raise HTTPException(
@@ -114,42 +214,68 @@ async def get_aqi_history(
             detail=f"Location with id {location_id} not found"
         )
     
-    # Get readings from last N hours
-    cutoff = datetime.now() - timedelta(hours=hours)
+    readings = [dict(row) for row in result.mappings()]
     
-    result = await db.execute(
-        select(AQIReading)
-        .where(
-            AQIReading.location_id == location_id,
-            AQIReading.recorded_at >= cutoff
-        )
-        .order_by(desc(AQIReading.recorded_at))
-    )
-    readings = result.scalars().all()
+    # Rows come straight from the database, so skip per-row model
+    # validation and encode with orjson; response_model documents the shape
+    return ORJSONResponse({
+        "readings": readings,
+        "total": len(readings),
+        "location_id": location.id,
+        "city": location.city,
+    })
+
+
+@router.get("/history/{location_id}/stream")
+async def stream_aqi_history(
+    location_id: int,
+    hours: int = Query(default=24, ge=1, le=720, description="Hours of history to retrieve"),
+    session_factory: async_sessionmaker = Depends(get_session_factory)
+):
+    """
+    Stream historical AQI data for a location as NDJSON.
     
-    return AQIHistoryResponse(
-        readings=[AQIReadingResponse.model_validate(r) for r in readings],
-        total=len(readings),
-        location_id=location.id,
-        city=location.city
-    )
+    Emits one reading per line, newest first, fetching rows from the
+    database in batches so memory stays bounded for long windows.
+    """
+    async with session_factory() as db:
+        result = await db.execute(LOCATION_STMT, {"location_id": location_id})
+        if result.one_or_none() is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Location with id {location_id} not found"
+            )
+    
+    cutoff = datetime.now(timezone.utc) - timedelta(hours=hours)
+    
+    async def generate():
+        # The generator runs after the handler returns, so it owns its session
+        async with session_factory() as db:
+            result = await db.stream(
+                HISTORY_STMT,
+                {"location_id": location_id, "cutoff": cutoff},
+                execution_options={"yield_per": HISTORY_STREAM_BATCH_SIZE}
+            )
+            async for partition in result.mappings().partitions():
+                yield b"".join(orjson.dumps(dict(row)) + b"\n" for row in partition)
+    
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
 
 
 @router.get("/fetch/{location_id}", response_model=AQICurrentResponse)
 async def fetch_fresh_aqi(
     location_id: int,
-    db: AsyncSession = Depends(get_db)
+    session_factory: async_sessionmaker = Depends(get_session_factory)
 ):
     """
     Fetch fresh AQI data from external API and store it.
     
     Use this to manually trigger a data refresh.
     """
-    # Get location
-    result = await db.execute(
-        select(Location).where(Location.id == location_id)
-    )
-    location = result.scalar_one_or_none()
+    # Get location (connection is released before the external fetch)
+    async with session_factory() as db:
+        result = await db.execute(LOCATION_STMT, {"location_id": location_id})
+        location = result.one_or_none()
     
     if not location:
         raise HTTPException(
@@ -157,10 +283,11 @@ async def fetch_fresh_aqi(
             detail=f"Location with id {location_id} not found"
         )
     
-    # Fetch from API
+    # Fetch from API, bypassing the short-lived response cache
     aqi_data = await aqi_fetcher.fetch_current_aqi(
         location.latitude,
-        location.longitude
+        location.longitude,
+        use_cache=False
     )
     
     if not aqi_data:
@@ -170,55 +297,110 @@ async def fetch_fresh_aqi(
         )
     
     # Store reading
-    reading = AQIReading(
-        location_id=location_id,
-        pm25=aqi_data.get("pm25"),
-        pm10=aqi_data.get("pm10"),
-        o3=aqi_data.get("o3"),
-        no2=aqi_data.get("no2"),
-        so2=aqi_data.get("so2"),
-        co=aqi_data.get("co"),
-        aqi_value=aqi_data.get("aqi_value", 0),
-        aqi_category=aqi_data.get("aqi_category"),
-        recorded_at=aqi_data.get("recorded_at", datetime.now()),
+    row = build_reading_row(location_id, aqi_data)
+    async with session_factory() as db:
+        await bulk_insert_readings(db, [row])
+    
+    return _current_response_from_row(location, row)
+
+
+@router.post("/fetch/{location_id}/enqueue", status_code=status.HTTP_202_ACCEPTED)
+async def enqueue_aqi_fetch(
+    location_id: int,
+    session_factory: async_sessionmaker = Depends(get_session_factory)
+):
+    """
+    Queue a fresh AQI fetch for a location and return immediately.
+    
+    The fetch and insert are done by the background worker
+    (`python -m app.worker`), batched with other queued locations.
+    Requires REDIS_URL to be configured.
+    """
+    if not fetch_queue.enabled:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Fetch queue is not configured"
+        )
+    
+    async with session_factory() as db:
+        result = await db.execute(LOCATION_STMT, {"location_id": location_id})
+        if result.one_or_none() is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Location with id {location_id} not found"
+            )
+    
+    job_id = await fetch_queue.enqueue(location_id)
+    
+    return {
+        "message": "AQI fetch queued",
+        "location_id": location_id,
+        "job_id": job_id
+    }
+
+
+@router.post("/fetch/batch", response_model=AQIBatchFetchResponse)
+async def fetch_fresh_aqi_batch(
+    request: AQIBatchFetchRequest,
+    session_factory: async_sessionmaker = Depends(get_session_factory)
+):
+    """
+    Fetch fresh AQI data for several locations and store it.
+    
+    External requests run concurrently; locations that are unknown or
+    whose fetch failed are reported in failed_location_ids.
+    """
+    async with session_factory() as db:
+        result = await db.execute(
+            select(*LOCATION_COLUMNS).where(Location.id.in_(request.location_ids))
+        )
+        locations = result.all()
+    
+    results = await aqi_fetcher.fetch_current_aqi_many(
+        [(location.latitude, location.longitude) for location in locations],
+        use_cache=False
     )
-    db.add(reading)
-    await db.commit()
-    await db.refresh(reading)
     
-    return AQICurrentResponse(
-        location_id=location.id,
-        city=location.city,
-        country=location.country,
-        aqi_value=reading.aqi_value,
-        aqi_category=reading.aqi_category or AQIReading.get_category(reading.aqi_value),
-        pm25=reading.pm25,
-        pm10=reading.pm10,
-        o3=reading.o3,
-        no2=reading.no2,
-        so2=reading.so2,
-        co=reading.co,
-        recorded_at=reading.recorded_at,
-        health_advisory=AQICurrentResponse.get_health_advisory(reading.aqi_value)
+    now = datetime.now(timezone.utc)
+    fetched = [
+        (location, build_reading_row(location.id, aqi_data, now))
+        for location, aqi_data in zip(locations, results)
+        if aqi_data
+    ]
+    
+    async with session_factory() as db:
+        await bulk_insert_readings(db, [row for _, row in fetched])
+    
+    fetched_ids = {location.id for location, _ in fetched}
+    return AQIBatchFetchResponse(
+        readings=[_current_response_from_row(location, row) for location, row in fetched],
+        failed_location_ids=[
+            location_id for location_id in dict.fromkeys(request.location_ids)
+            if location_id not in fetched_ids
+        ]
     )
 
 
 @router.get("/stats/{location_id}")
 async def get_aqi_stats(
     location_id: int,
-    hours: int = Query(default=24, ge=1, le=720),
-    db: AsyncSession = Depends(get_db)
+    hours: int = Query(default=24, ge=1, le=720)
 ):
     """
     Get AQI statistics for a location.
     
     Returns min, max, average, and trend data.
     """
-    # Get location
-    result = await db.execute(
-        select(Location).where(Location.id == location_id)
+    # Aggregate in the database, concurrently with the location lookup
+    now = datetime.now(timezone.utc)
+    cutoff = now - timedelta(hours=hours)
+    midpoint = cutoff + (now - cutoff) / 2
+    location_result, result = await execute_concurrently(
+        LOCATION_STMT,
+        STATS_STMT,
+        params={"location_id": location_id, "cutoff": cutoff, "midpoint": midpoint}
     )
-    location = result.scalar_one_or_none()
+    location = location_result.one_or_none()
     
     if not location:
         raise HTTPException(
@@ -226,19 +408,9 @@ async def get_aqi_stats(
             detail=f"Location with id {location_id} not found"
         )
     
-    # Get readings
-    cutoff = datetime.now() - timedelta(hours=hours)
-    result = await db.execute(
-        select(AQIReading)
-        .where(
-            AQIReading.location_id == location_id,
-            AQIReading.recorded_at >= cutoff
-        )
-        .order_by(AQIReading.recorded_at)
-    )
-    readings = result.scalars().all()
+    count, min_aqi, max_aqi, avg_aqi, first_half_avg, second_half_avg = result.one()
     
-    if not readings:
+    if not count:
         return {
             "location_id": location_id,
             "city": location.city,
@@ -250,13 +422,10 @@ async def get_aqi_stats(
             "trend": "unknown"
         }
     
-    aqi_values = [r.aqi_value for r in readings]
-    
     # Calculate trend (comparing first and second halves)
-    mid = len(aqi_values) // 2
-    if mid > 0:
-        first_half_avg = sum(aqi_values[:mid]) / mid
-        second_half_avg = sum(aqi_values[mid:]) / (len(aqi_values) - mid)
+    if first_half_avg is not None and second_half_avg is not None:
+        first_half_avg = float(first_half_avg)
+        second_half_avg = float(second_half_avg)
         
         if second_half_avg > first_half_avg * 1.1:
             trend = "worsening"
@@ -271,9 +440,9 @@ async def get_aqi_stats(
         "location_id": location_id,
         "city": location.city,
         "hours": hours,
-        "count": len(readings),
-        "min": min(aqi_values),
-        "max": max(aqi_values),
-        "avg": round(sum(aqi_values) / len(aqi_values), 1),
+        "count": count,
+        "min": min_aqi,
+        "max": max_aqi,
+        "avg": round(float(avg_aqi), 1),
         "trend": trend
     }
@@ -5,15 +5,24 @@ Endpoints for managing monitored locations
 
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, func
 from typing import List
+from pydantic import TypeAdapter
 
-from app.database import get_db
+from app.cache import invalidate_current_aqi
+from app.database import get_db, insert_ignoring_conflicts
 from app.models import Location
 from app.schemas import LocationCreate, LocationResponse, LocationListResponse
+from app.routers.websocket import invalidate_location
 
 router = APIRouter(prefix="/locations", tags=["locations"])
 
+# Unique key of a location (uq_locations_coords)
+LOCATION_KEY = ("latitude", "longitude")
+
+# Validates a whole list of ORM rows in one call into pydantic-core
+LOCATIONS_ADAPTER = TypeAdapter(list[LocationResponse])
+
 
 @router.get("", response_model=LocationListResponse)
 async def list_locations(
@@ -36,11 +45,12 @@ async def list_locations(
     locations = result.scalars().all()
     
     # Get total count
-    count_result = await db.execute(select(Location))
-    total = len(count_result.scalars().all())
+    total = (
+        await db.execute(select(func.count()).select_from(Location))
+    ).scalar_one()
     
     return LocationListResponse(
-        locations=[LocationResponse.model_validate(loc) for loc in locations],
+        locations=LOCATIONS_ADAPTER.validate_python(locations),
         total=total
     )
 
@@ -80,25 +90,23 @@ async def create_location(
     - **latitude**: Latitude coordinate (-90 to 90)
     - **longitude**: Longitude coordinate (-180 to 180)
     """
-    # Check for duplicate
+    # RETURNING brings back server defaults without a follow-up SELECT;
+    # no row comes back if the coordinates are taken, even by a
+    # concurrent request
     result = await db.execute(
-        select(Location).where(
-            Location.latitude == location_data.latitude,
-            Location.longitude == location_data.longitude
-        )
+        insert_ignoring_conflicts(Location.__table__, LOCATION_KEY)
+        .values(**location_data.model_dump())
+        .returning(*Location.__table__.columns)
     )
-    existing = result.scalar_one_or_none()
+    location = result.one_or_none()
     
-    if existing:
+    if location is None:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Location with these coordinates already exists"
         )
     
-    location = Location(**location_data.model_dump())
-    db.add(location)
     await db.commit()
-    await db.refresh(location)
     
     return LocationResponse.model_validate(location)
 
@@ -124,3 +132,5 @@ async def delete_location(
     
     await db.delete(location)
     await db.commit()
+    invalidate_current_aqi(location_id)
+    invalidate_location(location_id)
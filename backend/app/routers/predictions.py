@@ -5,11 +5,13 @@ Endpoints for GA-KELM AQI predictions
 
 from fastapi import APIRouter, Depends, HTTPException, status, Query, BackgroundTasks
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, desc
-from datetime import datetime, timedelta
+from sqlalchemy import bindparam, select, desc, delete, insert
+from datetime import datetime, timedelta, timezone
 from typing import Optional
+from pydantic import TypeAdapter
+import numpy as np
 
-from app.database import get_db
+from app.database import get_db, copy_records, execute_concurrently
 from app.models import Location, AQIReading, Prediction, ModelMetadata
 from app.schemas import (
     PredictionResponse,
@@ -17,9 +19,48 @@ from app.schemas import (
     ModelInfoResponse
 )
 from app.ml.predictor import predictor_service
+from app.services.reading_store import as_utc
 
 router = APIRouter(prefix="/predictions", tags=["predictions"])
 
+# Columns written when bulk-loading generated predictions
+PREDICTION_COPY_COLUMNS = (
+    "location_id",
+    "predicted_aqi",
+    "predicted_category",
+    "confidence",
+    "prediction_for",
+)
+
+# Validates a whole list of ORM rows in one call into pydantic-core
+PREDICTIONS_ADAPTER = TypeAdapter(list[PredictionResponse])
+
+# Statements are built once at import; per-request values are passed
+# as bound parameters when executing
+LOCATION_STMT = select(Location.id, Location.city).where(Location.id == bindparam("location_id"))
+
+# Upcoming predictions for a location, up to and including "until"
+UPCOMING_PREDICTIONS_STMT = (
+    select(Prediction)
+    .where(
+        Prediction.location_id == bindparam("location_id"),
+        Prediction.prediction_for >= bindparam("now"),
+        Prediction.prediction_for <= bindparam("until")
+    )
+    .order_by(Prediction.prediction_for)
+)
+
+# Predictions for a location whose target time is in [since, now)
+PAST_PREDICTIONS_STMT = (
+    select(Prediction)
+    .where(
+        Prediction.location_id == bindparam("location_id"),
+        Prediction.prediction_for >= bindparam("since"),
+        Prediction.prediction_for < bindparam("now")
+    )
+    .order_by(Prediction.prediction_for)
+)
+
 
 @router.get("/{location_id}", response_model=PredictionListResponse)
 async def get_predictions(
@@ -33,11 +74,19 @@ async def get_predictions(
     - **location_id**: Location ID
     - **hours_ahead**: Number of hours to predict (1-72, default 24)
     """
-    # Get location
-    result = await db.execute(
-        select(Location).where(Location.id == location_id)
+    # Get location and existing predictions for the future concurrently
+    now = datetime.now(timezone.utc)
+    until = now + timedelta(hours=hours_ahead)
+    location_result, result = await execute_concurrently(
+        LOCATION_STMT,
+        UPCOMING_PREDICTIONS_STMT,
+        params={
+            "location_id": location_id,
+            "now": now,
+            "until": until,
+        }
     )
-    location = result.scalar_one_or_none()
+    location = location_result.one_or_none()
     
     if not location:
         raise HTTPException(
@@ -45,17 +94,6 @@ async def get_predictions(
             detail=f"Location with id {location_id} not found"
         )
     
-    # Get existing predictions for the future
-    now = datetime.now()
-    result = await db.execute(
-        select(Prediction)
-        .where(
-            Prediction.location_id == location_id,
-            Prediction.prediction_for >= now,
-            Prediction.prediction_for <= now + timedelta(hours=hours_ahead)
-        )
-        .order_by(Prediction.prediction_for)
-    )
     predictions = result.scalars().all()
     
     # If no predictions, generate them
@@ -67,24 +105,23 @@ async def get_predictions(
         )
         
         if predictions:
-            for pred in predictions:
-                db.add(pred)
-            await db.commit()
-            
-            # Refresh to get IDs
+            # Insert and get IDs back in the same round-trip, in the
+            # order the rows were generated
             result = await db.execute(
-                select(Prediction)
-                .where(
-                    Prediction.location_id == location_id,
-                    Prediction.prediction_for >= now
-                )
-                .order_by(Prediction.prediction_for)
-                .limit(hours_ahead)
+                insert(Prediction).returning(Prediction, sort_by_parameter_order=True),
+                predictions
             )
-            predictions = result.scalars().all()
+            
+            # Predictions from stale readings can target times already
+            # past; only return the requested window
+            predictions = [
+                prediction for prediction in result.scalars().all()
+                if now <= as_utc(prediction.prediction_for) <= until
+            ]
+            await db.commit()
     
     return PredictionListResponse(
-        predictions=[PredictionResponse.model_validate(p) for p in predictions],
+        predictions=PREDICTIONS_ADAPTER.validate_python(predictions),
         total=len(predictions),
         location_id=location.id,
         city=location.city
@@ -104,10 +141,8 @@ async def generate_predictions(
     This will overwrite any existing future predictions.
     """
     # Get location
-    result = await db.execute(
-        select(Location).where(Location.id == location_id)
-    )
-    location = result.scalar_one_or_none()
+    result = await db.execute(LOCATION_STMT, {"location_id": location_id})
+    location = result.one_or_none()
     
     if not location:
         raise HTTPException(
@@ -115,18 +150,16 @@ async def generate_predictions(
             detail=f"Location with id {location_id} not found"
         )
     
-    # Delete existing future predictions
-    now = datetime.now()
-    result = await db.execute(
-        select(Prediction)
+    # Delete existing future predictions (committed together with the new ones)
+    now = datetime.now(timezone.utc)
+    await db.execute(
+        delete(Prediction)
         .where(
             Prediction.location_id == location_id,
             Prediction.prediction_for >= now
         )
+        .execution_options(synchronize_session=False)
     )
-    old_predictions = result.scalars().all()
-    for pred in old_predictions:
-        await db.delete(pred)
     
     # Generate new predictions
     predictions = await predictor_service.predict_future(
@@ -141,8 +174,13 @@ async def generate_predictions(
             detail="Failed to generate predictions. Model may not be trained yet."
         )
     
-    for pred in predictions:
-        db.add(pred)
+    # Bulk-load with COPY (no IDs are needed in the response)
+    await copy_records(
+        db,
+        Prediction.__table__,
+        PREDICTION_COPY_COLUMNS,
+        [tuple(p[column] for column in PREDICTION_COPY_COLUMNS) for p in predictions]
+    )
     await db.commit()
     
     return {
@@ -168,23 +206,22 @@ async def trigger_training(
     Note: Training may take several minutes depending on data size.
     """
     # Get training data from last 30 days
-    cutoff = datetime.now() - timedelta(days=30)
-    result = await db.execute(
-        select(AQIReading)
-        .where(AQIReading.recorded_at >= cutoff)
-        .order_by(AQIReading.recorded_at)
+    cutoff = datetime.now(timezone.utc) - timedelta(days=30)
+    aqi_values, time_features, pollution = await predictor_service._fetch_training_arrays(
+        db, since=cutoff
     )
-    readings = list(result.scalars().all())
     
-    if len(readings) < 100:
+    if len(aqi_values) < 100:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Insufficient data for training. Have {len(readings)}, need at least 100 readings."
+            detail=f"Insufficient data for training. Have {len(aqi_values)}, need at least 100 readings."
         )
     
     # Train model
     model = await predictor_service.train_model(
-        readings=readings,
+        aqi_values=aqi_values,
+        time_features=time_features,
+        pollution=pollution,
         session=db,
         population_size=population_size,
         generations=generations
@@ -243,11 +280,16 @@ async def get_prediction_accuracy(
     
     Returns MAE and RMSE for predictions made in the last N hours.
     """
-    # Get location
-    result = await db.execute(
-        select(Location).where(Location.id == location_id)
+    now = datetime.now(timezone.utc)
+    cutoff = now - timedelta(hours=hours)
+    
+    # Get location and past predictions concurrently
+    location_result, result = await execute_concurrently(
+        LOCATION_STMT,
+        PAST_PREDICTIONS_STMT,
+        params={"location_id": location_id, "since": cutoff, "now": now}
     )
-    location = result.scalar_one_or_none()
+    location = location_result.one_or_none()
     
     if not location:
         raise HTTPException(
@@ -255,19 +297,6 @@ async def get_prediction_accuracy(
             detail=f"Location with id {location_id} not found"
         )
     
-    now = datetime.now()
-    cutoff = now - timedelta(hours=hours)
-    
-    # Get past predictions
-    result = await db.execute(
-        select(Prediction)
-        .where(
-            Prediction.location_id == location_id,
-            Prediction.prediction_for >= cutoff,
-            Prediction.prediction_for < now
-        )
-        .order_by(Prediction.prediction_for)
-    )
     predictions = result.scalars().all()
     
     if not predictions:
@@ -281,26 +310,42 @@ async def get_prediction_accuracy(
             "message": "No predictions available for evaluation"
         }
     
-    # Match predictions with actual readings
-    errors = []
-    for pred in predictions:
-        # Find closest actual reading
-        result = await db.execute(
-            select(AQIReading)
-            .where(
-                AQIReading.location_id == location_id,
-                AQIReading.recorded_at >= pred.prediction_for - timedelta(minutes=30),
-                AQIReading.recorded_at <= pred.prediction_for + timedelta(minutes=30)
-            )
-            .order_by(AQIReading.recorded_at)
-            .limit(1)
+    # Load every actual reading that can match a prediction in one query
+    match_window = timedelta(minutes=30)
+    result = await db.execute(
+        select(AQIReading.recorded_at, AQIReading.aqi_value)
+        .where(
+            AQIReading.location_id == location_id,
+            AQIReading.recorded_at >= predictions[0].prediction_for - match_window,
+            AQIReading.recorded_at <= predictions[-1].prediction_for + match_window
         )
-        actual = result.scalar_one_or_none()
-        
-        if actual:
-            errors.append(abs(pred.predicted_aqi - actual.aqi_value))
+        .order_by(AQIReading.recorded_at)
+    )
+    readings = result.all()
+    
+    # Match each prediction with the first reading within 30 minutes of
+    # its target time, vectorized over epoch seconds
+    window = match_window.total_seconds()
+    pred_times = np.fromiter(
+        (p.prediction_for.timestamp() for p in predictions), dtype=np.float64, count=len(predictions)
+    )
+    pred_values = np.fromiter(
+        (p.predicted_aqi for p in predictions), dtype=np.float64, count=len(predictions)
+    )
+    reading_times = np.fromiter(
+        (r.recorded_at.timestamp() for r in readings), dtype=np.float64, count=len(readings)
+    )
+    reading_values = np.fromiter(
+        (r.aqi_value for r in readings), dtype=np.float64, count=len(readings)
+    )
+    
+    idx = np.searchsorted(reading_times, pred_times - window, side="left")
+    in_range = idx < len(readings)
+    matched = np.zeros(len(predictions), dtype=bool)
+    matched[in_range] = reading_times[idx[in_range]] <= pred_times[in_range] + window
+    errors = np.abs(pred_values[matched] - reading_values[idx[matched]])
     
-    if not errors:
+    if not errors.size:
         return {
             "location_id": location_id,
             "city": location.city,
@@ -312,15 +357,15 @@ async def get_prediction_accuracy(
             "message": "No matching actual readings found"
         }
     
-    mae = sum(errors) / len(errors)
-    rmse = (sum(e**2 for e in errors) / len(errors)) ** 0.5
+    mae = float(errors.mean())
+    rmse = float(np.sqrt((errors * errors).mean()))
     
     return {
         "location_id": location_id,
         "city": location.city,
         "hours_evaluated": hours,
         "predictions_count": len(predictions),
-        "matched_count": len(errors),
+        "matched_count": int(errors.size),
         "mae": round(mae, 2),
         "rmse": round(rmse, 2),
         "accuracy_percentage": round(100 - (mae / 5), 1)  # Rough accuracy estimate
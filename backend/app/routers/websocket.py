@@ -5,13 +5,19 @@ Provides live AQI updates to connected clients
 
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, desc
+from sqlalchemy import Row, bindparam, select, desc, func
+from sqlalchemy.orm import aliased
 import asyncio
-import json
-from datetime import datetime
-from typing import Dict, Set
+from cachetools import TTLCache
+from collections import defaultdict
+import orjson
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
 import logging
+import time
+import zlib
 
+from app.cache import get_redis, latest_data_key, readings_channel, LATEST_DATA_TTL_SECONDS
 from app.database import async_session_maker
 from app.models import Location, AQIReading, Prediction
 
@@ -19,6 +25,136 @@ router = APIRouter(tags=["websocket"])
 logger = logging.getLogger(__name__)
 
 
+# Seconds between data updates and keep-alive pings sent to clients
+UPDATE_INTERVAL_SECONDS = 30
+PING_INTERVAL_SECONDS = 15
+
+# With Redis, updates are pushed when new readings are announced; this is
+# only a heartbeat in case a notification is missed
+NOTIFIED_UPDATE_INTERVAL_SECONDS = 60
+
+# Messages buffered per client before the oldest is dropped
+OUTBOX_SIZE = 64
+
+# Clients queued per broadcast before yielding to the event loop
+BROADCAST_BATCH_SIZE = 50
+
+# Payloads at least this large are zlib-compressed once and marked with a
+# leading flag byte; per-client permessage-deflate is disabled in uvicorn
+COMPRESS_MIN_BYTES = 1024
+COMPRESSED_FLAG = b"\x01"
+
+# Location fields included in every update message
+LOCATION_COLUMNS = (
+    Location.id,
+    Location.city,
+    Location.country,
+    Location.latitude,
+    Location.longitude,
+)
+
+# Reading and prediction fields included in update messages; selected as
+# plain rows since this path is read-only and needs no ORM instances
+READING_COLUMNS = (
+    AQIReading.location_id,
+    AQIReading.aqi_value,
+    AQIReading.aqi_category,
+    AQIReading.pm25,
+    AQIReading.pm10,
+    AQIReading.o3,
+    AQIReading.no2,
+    AQIReading.so2,
+    AQIReading.co,
+    AQIReading.recorded_at,
+)
+
+PREDICTION_COLUMNS = (
+    Prediction.location_id,
+    Prediction.predicted_aqi,
+    Prediction.predicted_category,
+    Prediction.confidence,
+    Prediction.prediction_for,
+)
+
+# Statements are built once at import; per-call values are passed as
+# bound parameters so each compiles once into SQLAlchemy's cache
+LOCATION_STMT = select(*LOCATION_COLUMNS).where(Location.id == bindparam("location_id"))
+
+LATEST_READING_STMT = (
+    select(*READING_COLUMNS)
+    .where(AQIReading.location_id == bindparam("location_id"))
+    .order_by(desc(AQIReading.recorded_at))
+    .limit(1)
+)
+
+# Predictions shown with each update (the next 6 hours)
+UPCOMING_PREDICTIONS_LIMIT = 6
+
+UPCOMING_PREDICTIONS_STMT = (
+    select(*PREDICTION_COLUMNS)
+    .where(
+        Prediction.location_id == bindparam("location_id"),
+        Prediction.prediction_for >= bindparam("now")
+    )
+    .order_by(Prediction.prediction_for)
+    .limit(UPCOMING_PREDICTIONS_LIMIT)
+)
+
+ALL_LOCATIONS_STMT = select(*LOCATION_COLUMNS).order_by(Location.id)
+
+# Latest reading of every location; the correlated subquery is an index
+# lookup per location rather than a scan of all readings
+_latest = aliased(AQIReading)
+ALL_LATEST_READINGS_STMT = select(*READING_COLUMNS).where(
+    AQIReading.id.in_(
+        select(
+            select(_latest.id)
+            .where(_latest.location_id == Location.id)
+            .order_by(desc(_latest.recorded_at))
+            .limit(1)
+            .correlate(Location)
+            .scalar_subquery()
+        ).select_from(Location)
+    )
+)
+
+# Upcoming predictions of every location; future predictions are few, so
+# ranking them per location is cheap
+_upcoming = (
+    select(
+        Prediction.id,
+        func.row_number().over(
+            partition_by=Prediction.location_id,
+            order_by=Prediction.prediction_for
+        ).label("rank")
+    )
+    .where(Prediction.prediction_for >= bindparam("now"))
+    .subquery()
+)
+ALL_UPCOMING_PREDICTIONS_STMT = (
+    select(*PREDICTION_COLUMNS)
+    .join(_upcoming, Prediction.id == _upcoming.c.id)
+    .where(_upcoming.c.rank <= UPCOMING_PREDICTIONS_LIMIT)
+    .order_by(Prediction.location_id, Prediction.prediction_for)
+)
+
+# Location fields per location_id; locations are effectively static, so
+# this saves a query on every update
+_location_cache: TTLCache = TTLCache(maxsize=1024, ttl=600)
+
+
+def encode_message(message: dict) -> bytes:
+    """
+    Encode a message as UTF-8 JSON for a binary websocket frame.
+    orjson serializes datetimes natively as ISO 8601. Large payloads are
+    compressed here, once, rather than per client by the websocket layer.
+    """
+    payload = orjson.dumps(message)
+    if len(payload) >= COMPRESS_MIN_BYTES:
+        return COMPRESSED_FLAG + zlib.compress(payload, 6)
+    return payload
+
+
 class ConnectionManager:
     """
     Manages WebSocket connections for real-time updates.
@@ -27,34 +163,173 @@ class ConnectionManager:
     
     def __init__(self):
         # location_id -> set of connected websockets
-        self.active_connections: Dict[int, Set[WebSocket]] = {}
-        self._broadcast_task = None
+        self.active_connections: Dict[int, List[WebSocket]] = {}
+        # location_id -> task pushing periodic updates to its clients
+        self._broadcasters: Dict[int, asyncio.Task] = {}
+        # Per-client outbound queue and the writer task draining it, so a
+        # slow client never delays messages to the others
+        self._outboxes: Dict[WebSocket, asyncio.Queue] = {}
+        self._writers: Dict[WebSocket, asyncio.Task] = {}
+        # ISO timestamp shared by every message sent within the same second
+        self._timestamp_second: Optional[int] = None
+        self._timestamp = ""
+    
+    def current_timestamp(self) -> str:
+        """Current UTC time as ISO string, formatted at most once per second"""
+        second = int(time.time())
+        if second != self._timestamp_second:
+            self._timestamp_second = second
+            self._timestamp = datetime.fromtimestamp(second, tz=timezone.utc).isoformat()
+        return self._timestamp
     
     async def connect(self, websocket: WebSocket, location_id: int):
         """Accept a new WebSocket connection"""
         await websocket.accept()
         
         if location_id not in self.active_connections:
-            self.active_connections[location_id] = set()
+            self.active_connections[location_id] = []
+        
+        self.active_connections[location_id].append(websocket)
         
-        self.active_connections[location_id].add(websocket)
-        logger.info(f"Client connected for location {location_id}")
+        outbox = asyncio.Queue(maxsize=OUTBOX_SIZE)
+        self._outboxes[websocket] = outbox
+        self._writers[websocket] = asyncio.create_task(self._writer(websocket, outbox))
+        
+        # One broadcaster per location, shared by all of its clients
+        if location_id not in self._broadcasters:
+            self._broadcasters[location_id] = asyncio.create_task(
+                self._broadcast_loop(location_id)
+            )
+        
+        logger.info("Client connected for location %s", location_id)
     
     def disconnect(self, websocket: WebSocket, location_id: int):
         """Remove a WebSocket connection"""
+        # Let the writer flush what is already queued, then stop
+        outbox = self._outboxes.pop(websocket, None)
+        writer = self._writers.pop(websocket, None)
+        if outbox is not None:
+            try:
+                outbox.put_nowait(None)
+            except asyncio.QueueFull:
+                writer.cancel()
+        
         if location_id in self.active_connections:
-            self.active_connections[location_id].discard(websocket)
+            # Disconnects are rare next to broadcasts, so a linear remove
+            # is fine in exchange for contiguous iteration
+            try:
+                self.active_connections[location_id].remove(websocket)
+            except ValueError:
+                pass
             
-            # Clean up empty sets
+            # Clean up empty lists and stop their broadcaster
             if not self.active_connections[location_id]:
                 del self.active_connections[location_id]
+                
+                broadcaster = self._broadcasters.pop(location_id, None)
+                if broadcaster is not None:
+                    broadcaster.cancel()
+        
+        logger.info("Client disconnected from location %s", location_id)
+    
+    async def _broadcast_loop(self, location_id: int):
+        """
+        Push keep-alive pings and data updates to every client of a
+        location. Data is fetched once per update regardless of how many
+        clients are connected.
+        
+        With Redis configured, updates follow new-reading notifications
+        from the ingest path; otherwise data is polled on a fixed interval.
+        """
+        loop = asyncio.get_running_loop()
+        pubsub = None
+        update_interval = UPDATE_INTERVAL_SECONDS
         
-        logger.info(f"Client disconnected from location {location_id}")
+        redis = get_redis()
+        if redis is not None:
+            try:
+                pubsub = redis.pubsub(ignore_subscribe_messages=True)
+                await pubsub.subscribe(readings_channel(location_id))
+                update_interval = NOTIFIED_UPDATE_INTERVAL_SECONDS
+            except Exception as e:
+                logger.warning(f"Readings subscription failed, polling instead: {e}")
+                pubsub = None
+        
+        next_ping = loop.time() + PING_INTERVAL_SECONDS
+        next_update = loop.time() + update_interval
+        
+        try:
+            while location_id in self.active_connections:
+                timeout = max(min(next_ping, next_update) - loop.time(), 0)
+                notified = False
+                
+                try:
+                    if pubsub is not None:
+                        notified = await pubsub.get_message(timeout=timeout) is not None
+                    else:
+                        await asyncio.sleep(timeout)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.warning(f"Readings subscription lost, polling instead: {e}")
+                    await pubsub.reset()
+                    pubsub = None
+                    update_interval = UPDATE_INTERVAL_SECONDS
+                    continue
+                
+                now = loop.time()
+                timestamp = self.current_timestamp()
+                
+                try:
+                    if now >= next_ping:
+                        next_ping = now + PING_INTERVAL_SECONDS
+                        await self.broadcast_to_location(
+                            {"type": "ping", "timestamp": timestamp},
+                            location_id
+                        )
+                    
+                    if notified or now >= next_update:
+                        next_update = now + update_interval
+                        update_data = await get_latest_data(location_id, timestamp)
+                        await self.broadcast_to_location(update_data, location_id)
+                except Exception as e:
+                    logger.error(f"Broadcast error for location {location_id}: {e}")
+        finally:
+            if pubsub is not None:
+                await pubsub.aclose()
+    
+    async def _writer(self, websocket: WebSocket, outbox: asyncio.Queue):
+        """Send queued payloads to one client until told to stop (None)"""
+        while True:
+            payload = await outbox.get()
+            if payload is None:
+                return
+            
+            try:
+                await websocket.send_bytes(payload)
+            except Exception as e:
+                logger.warning("Failed to send to client: %s", e)
+                return
+    
+    def _enqueue(self, websocket: WebSocket, payload: bytes):
+        """Queue a payload for a client, dropping its oldest one when full"""
+        outbox = self._outboxes.get(websocket)
+        if outbox is None:
+            return
+        
+        if outbox.full():
+            outbox.get_nowait()
+            logger.warning("Client outbox full, dropping oldest message")
+        outbox.put_nowait(payload)
     
     async def send_personal_message(self, message: dict, websocket: WebSocket):
         """Send a message to a specific client"""
+        if websocket in self._outboxes:
+            self._enqueue(websocket, encode_message(message))
+            return
+        
         try:
-            await websocket.send_json(message)
+            await websocket.send_bytes(encode_message(message))
         except Exception as e:
             logger.error(f"Failed to send message: {e}")
     
@@ -63,18 +338,20 @@ class ConnectionManager:
         if location_id not in self.active_connections:
             return
         
-        disconnected = set()
+        # Encode once and queue the same payload for every client; writes
+        # happen in each client's writer task
+        payload = encode_message(message)
         
-        for websocket in self.active_connections[location_id]:
-            try:
-                await websocket.send_json(message)
-            except Exception as e:
-                logger.warning(f"Failed to broadcast to client: {e}")
-                disconnected.add(websocket)
+        # Snapshot, since clients may disconnect while we yield
+        clients = self.active_connections[location_id][:]
         
-        # Clean up disconnected clients
-        for ws in disconnected:
-            self.active_connections[location_id].discard(ws)
+        for i in range(0, len(clients), BROADCAST_BATCH_SIZE):
+            for websocket in clients[i:i + BROADCAST_BATCH_SIZE]:
+                self._enqueue(websocket, payload)
+            
+            # Let writers and other handlers run during large fan-outs
+            if i + BROADCAST_BATCH_SIZE < len(clients):
+                await asyncio.sleep(0)
     
     async def broadcast_to_all(self, message: dict):
         """Broadcast a message to all connected clients"""
@@ -84,7 +361,7 @@ class ConnectionManager:
     def get_connection_count(self, location_id: int = None) -> int:
         """Get number of active connections"""
         if location_id is not None:
-            return len(self.active_connections.get(location_id, set()))
+            return len(self.active_connections.get(location_id, ()))
         return sum(len(conns) for conns in self.active_connections.values())
 
 
@@ -92,72 +369,161 @@ class ConnectionManager:
 manager = ConnectionManager()
 
 
-async def get_latest_data(location_id: int) -> dict:
-    """Fetch latest AQI data and predictions for a location"""
+def invalidate_location(location_id: int) -> None:
+    """Drop the cached fields of a location"""
+    _location_cache.pop(location_id, None)
+
+
+def _latest_data_payload(location: dict, reading: Optional[Row], predictions: List[Row]) -> dict:
+    """Build the cacheable part of a location's update message"""
+    return {
+        "type": "update",
+        "location": location,
+        "current": {
+            "aqi_value": reading.aqi_value if reading else None,
+            "aqi_category": reading.aqi_category if reading else None,
+            "pm25": reading.pm25 if reading else None,
+            "pm10": reading.pm10 if reading else None,
+            "o3": reading.o3 if reading else None,
+            "no2": reading.no2 if reading else None,
+            "so2": reading.so2 if reading else None,
+            "co": reading.co if reading else None,
+            "recorded_at": reading.recorded_at.isoformat() if reading else None
+        } if reading else None,
+        "predictions": [
+            {
+                "predicted_aqi": p.predicted_aqi,
+                "predicted_category": p.predicted_category,
+                "confidence": p.confidence,
+                "prediction_for": p.prediction_for.isoformat()
+            }
+            for p in predictions
+        ],
+    }
+
+
+async def _query_latest_data(location_id: int) -> Optional[dict]:
+    """
+    Query the latest AQI reading and upcoming predictions for a location.
+    Returns None if the location does not exist.
+    """
     async with async_session_maker() as session:
-        # Get location
-        result = await session.execute(
-            select(Location).where(Location.id == location_id)
-        )
-        location = result.scalar_one_or_none()
-        
-        if not location:
-            return {"error": f"Location {location_id} not found"}
+        # Get location, from the cache when possible
+        location = _location_cache.get(location_id)
+        if location is None:
+            result = await session.execute(LOCATION_STMT, {"location_id": location_id})
+            row = result.one_or_none()
+            
+            if not row:
+                return None
+            
+            location = _location_cache[location_id] = row._asdict()
         
         # Get latest reading
-        result = await session.execute(
-            select(AQIReading)
-            .where(AQIReading.location_id == location_id)
-            .order_by(desc(AQIReading.recorded_at))
-            .limit(1)
-        )
-        reading = result.scalar_one_or_none()
+        result = await session.execute(LATEST_READING_STMT, {"location_id": location_id})
+        reading = result.one_or_none()
         
         # Get latest predictions
-        now = datetime.now()
         result = await session.execute(
-            select(Prediction)
-            .where(
-                Prediction.location_id == location_id,
-                Prediction.prediction_for >= now
-            )
-            .order_by(Prediction.prediction_for)
-            .limit(6)  # Next 6 hours
+            UPCOMING_PREDICTIONS_STMT,
+            {"location_id": location_id, "now": datetime.now(timezone.utc)}
         )
-        predictions = result.scalars().all()
+        predictions = result.all()
         
-        return {
-            "type": "update",
-            "location": {
-                "id": location.id,
-                "city": location.city,
-                "country": location.country,
-                "latitude": location.latitude,
-                "longitude": location.longitude
-            },
-            "current": {
-                "aqi_value": reading.aqi_value if reading else None,
-                "aqi_category": reading.aqi_category if reading else None,
-                "pm25": reading.pm25 if reading else None,
-                "pm10": reading.pm10 if reading else None,
-                "o3": reading.o3 if reading else None,
-                "no2": reading.no2 if reading else None,
-                "so2": reading.so2 if reading else None,
-                "co": reading.co if reading else None,
-                "recorded_at": reading.recorded_at.isoformat() if reading else None
-            } if reading else None,
-            "predictions": [
-                {
-                    "predicted_aqi": p.predicted_aqi,
-                    "predicted_category": p.predicted_category,
-                    "confidence": p.confidence,
-                    "prediction_for": p.prediction_for.isoformat()
-                }
-                for p in predictions
-            ],
-            "timestamp": datetime.now().isoformat(),
-            "connected_clients": manager.get_connection_count(location_id)
-        }
+        return _latest_data_payload(location, reading, predictions)
+
+
+async def _query_all_latest_data() -> list[dict]:
+    """
+    Latest data for every location using three set-based queries
+    (locations, latest reading per location, next 6 predictions per
+    location) instead of a round of queries per location.
+    """
+    async with async_session_maker() as session:
+        result = await session.execute(ALL_LOCATIONS_STMT)
+        locations = [row._asdict() for row in result]
+        _location_cache.update((location["id"], location) for location in locations)
+        
+        result = await session.execute(ALL_LATEST_READINGS_STMT)
+        readings = {reading.location_id: reading for reading in result}
+        
+        result = await session.execute(
+            ALL_UPCOMING_PREDICTIONS_STMT,
+            {"now": datetime.now(timezone.utc)}
+        )
+        predictions = defaultdict(list)
+        for prediction in result:
+            predictions[prediction.location_id].append(prediction)
+    
+    return [
+        _latest_data_payload(location, readings.get(location["id"]), predictions[location["id"]])
+        for location in locations
+    ]
+
+
+async def _cached_latest_data(location_id: int) -> Optional[dict]:
+    """
+    Latest data for a location, shared through Redis for a short TTL so
+    clients watching the same location reuse one set of queries.
+    """
+    redis = get_redis()
+    key = latest_data_key(location_id)
+    
+    if redis is not None:
+        try:
+            cached = await redis.get(key)
+            if cached is not None:
+                return orjson.loads(cached)
+        except Exception as e:
+            logger.warning(f"Latest-data cache read failed: {e}")
+    
+    data = await _query_latest_data(location_id)
+    
+    if redis is not None and data is not None:
+        try:
+            await redis.set(key, orjson.dumps(data), ex=LATEST_DATA_TTL_SECONDS)
+        except Exception as e:
+            logger.warning(f"Latest-data cache write failed: {e}")
+    
+    return data
+
+
+# location_id -> in-flight latest-data lookup shared by concurrent callers
+_inflight: Dict[int, asyncio.Task] = {}
+
+
+async def _load_latest_data(location_id: int) -> Optional[dict]:
+    """
+    Single-flight wrapper around _cached_latest_data: concurrent calls
+    for the same location await one lookup instead of each querying.
+    """
+    task = _inflight.get(location_id)
+    
+    if task is None:
+        task = asyncio.create_task(_cached_latest_data(location_id))
+        _inflight[location_id] = task
+        task.add_done_callback(lambda _: _inflight.pop(location_id, None))
+    
+    # Shielded so a disconnecting client does not cancel the shared lookup
+    return await asyncio.shield(task)
+
+
+async def get_latest_data(location_id: int, timestamp: Optional[str] = None) -> dict:
+    """
+    Fetch latest AQI data and predictions for a location.
+    `timestamp` lets a broadcast tick stamp all of its messages alike.
+    """
+    data = await _load_latest_data(location_id)
+    
+    if data is None:
+        return {"error": f"Location {location_id} not found"}
+    
+    # Per-message fields are never cached
+    return {
+        **data,
+        "timestamp": timestamp or manager.current_timestamp(),
+        "connected_clients": manager.get_connection_count(location_id)
+    }
 
 
 @router.websocket("/ws/aqi/{location_id}")
@@ -182,54 +548,22 @@ async def websocket_aqi(websocket: WebSocket, location_id: int):
         initial_data = await get_latest_data(location_id)
         await manager.send_personal_message(initial_data, websocket)
         
-        # Start periodic updates
-        update_interval = 30  # seconds
-        ping_interval = 15  # seconds
-        
-        last_update = datetime.now()
-        last_ping = datetime.now()
-        
+        # Periodic updates and pings come from the location's broadcaster;
+        # this loop only handles client messages
         while True:
             try:
-                # Check for client messages (non-blocking with timeout)
-                try:
-                    message = await asyncio.wait_for(
-                        websocket.receive_text(),
-                        timeout=1.0
-                    )
-                    
-                    # Handle client messages
-                    data = json.loads(message)
-                    
-                    if data.get("type") == "ping":
-                        await manager.send_personal_message(
-                            {"type": "pong", "timestamp": datetime.now().isoformat()},
-                            websocket
-                        )
-                    elif data.get("type") == "refresh":
-                        # Client requests immediate refresh
-                        update_data = await get_latest_data(location_id)
-                        await manager.send_personal_message(update_data, websocket)
-                        last_update = datetime.now()
-                        
-                except asyncio.TimeoutError:
-                    pass  # No message received, continue
-                
-                # Send periodic updates
-                now = datetime.now()
-                
-                if (now - last_update).total_seconds() >= update_interval:
-                    update_data = await get_latest_data(location_id)
-                    await manager.send_personal_message(update_data, websocket)
-                    last_update = now
+                message = await websocket.receive_text()
+                data = orjson.loads(message)
                 
-                # Send ping to keep connection alive
-                if (now - last_ping).total_seconds() >= ping_interval:
+                if data.get("type") == "ping":
                     await manager.send_personal_message(
-                        {"type": "ping", "timestamp": now.isoformat()},
+                        {"type": "pong", "timestamp": manager.current_timestamp()},
                         websocket
                     )
-                    last_ping = now
+                elif data.get("type") == "refresh":
+                    # Client requests immediate refresh
+                    update_data = await get_latest_data(location_id)
+                    await manager.send_personal_message(update_data, websocket)
                     
             except WebSocketDisconnect:
                 break
@@ -256,33 +590,45 @@ async def websocket_all_locations(websocket: WebSocket):
     """
     await websocket.accept()
     
+    loop = asyncio.get_running_loop()
+    # Wait on the client and the update timer together instead of sleeping
+    # blindly, so disconnects and refresh requests are seen immediately
+    recv_task = asyncio.create_task(websocket.receive_text())
+    
     try:
         while True:
-            try:
-                # Get all locations
-                async with async_session_maker() as session:
-                    result = await session.execute(select(Location))
-                    locations = result.scalars().all()
-                    
-                    all_data = []
-                    for location in locations:
-                        data = await get_latest_data(location.id)
-                        if "error" not in data:
-                            all_data.append(data)
-                    
-                    await websocket.send_json({
-                        "type": "all_locations",
-                        "locations": all_data,
-                        "timestamp": datetime.now().isoformat()
-                    })
-                
-                await asyncio.sleep(30)  # Update every 30 seconds
+            # Latest data for all locations in one batch of queries
+            all_data = await _query_all_latest_data()
+            timestamp = manager.current_timestamp()
+            
+            await websocket.send_bytes(encode_message({
+                "type": "all_locations",
+                "locations": [
+                    {
+                        **data,
+                        "timestamp": timestamp,
+                        "connected_clients": manager.get_connection_count(data["location"]["id"])
+                    }
+                    for data in all_data
+                ],
+                "timestamp": timestamp
+            }))
+            
+            deadline = loop.time() + UPDATE_INTERVAL_SECONDS
+            while (remaining := deadline - loop.time()) > 0:
+                done, _ = await asyncio.wait({recv_task}, timeout=remaining)
+                if not done:
+                    break
                 
-            except WebSocketDisconnect:
-                break
-            except Exception as e:
-                logger.error(f"WebSocket error: {e}")
-                break
+                # Raises WebSocketDisconnect once the client has gone
+                data = orjson.loads(recv_task.result())
+                recv_task = asyncio.create_task(websocket.receive_text())
+                if data.get("type") == "refresh":
+                    break
                 
     except WebSocketDisconnect:
         pass
+    except Exception as e:
+        logger.error(f"WebSocket error: {e}")
+    finally:
+        recv_task.cancel()
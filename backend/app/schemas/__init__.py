@@ -5,11 +5,15 @@ from app.schemas.aqi import (
     AQIReadingResponse,
     AQICurrentResponse,
     AQIHistoryResponse,
+    AQIBatchFetchRequest,
+    AQIBatchFetchResponse,
 )
 from app.schemas.prediction import (
     PredictionCreate,
     PredictionResponse,
     PredictionListResponse,
+    PredictionWithActual,
+    ModelInfoResponse,
 )
 from app.schemas.location import (
     LocationCreate,
@@ -22,9 +26,13 @@ __all__ = [
     "AQIReadingResponse", 
     "AQICurrentResponse",
     "AQIHistoryResponse",
+    "AQIBatchFetchRequest",
+    "AQIBatchFetchResponse",
     "PredictionCreate",
     "PredictionResponse",
     "PredictionListResponse",
+    "PredictionWithActual",
+    "ModelInfoResponse",
     "LocationCreate",
     "LocationResponse",
     "LocationListResponse",
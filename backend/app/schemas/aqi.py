@@ -2,10 +2,25 @@
 Pydantic schemas for AQI data validation
 """
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from datetime import datetime
 from typing import Optional
 
+from app.models.aqi_reading import AQI_MAX, aqi_level, aqi_table_index
+
+# Health advisory per AQI category (same order as AQI_CATEGORIES)
+HEALTH_ADVISORIES = (
+    "Air quality is satisfactory, and air pollution poses little or no risk.",
+    "Air quality is acceptable. However, there may be a risk for some people.",
+    "Members of sensitive groups may experience health effects.",
+    "Everyone may begin to experience health effects.",
+    "Health warnings of emergency conditions. Everyone is more likely to be affected.",
+    "Health alert: everyone may experience more serious health effects.",
+)
+
+# Advisory for every integer AQI value 0..AQI_MAX, built once at import
+_ADVISORY_TABLE = tuple(HEALTH_ADVISORIES[aqi_level(value)] for value in range(AQI_MAX + 1))
+
 
 class AQIReadingBase(BaseModel):
     """Base AQI reading schema"""
@@ -27,13 +42,12 @@ class AQIReadingCreate(AQIReadingBase):
 
 class AQIReadingResponse(AQIReadingBase):
     """Schema for AQI reading response"""
+    model_config = ConfigDict(from_attributes=True)
+    
     id: int
     location_id: int
     recorded_at: datetime
     created_at: datetime
-    
-    class Config:
-        from_attributes = True
 
 
 class AQICurrentResponse(BaseModel):
@@ -55,18 +69,7 @@ class AQICurrentResponse(BaseModel):
     @staticmethod
     def get_health_advisory(aqi_value: int) -> str:
         """Get health advisory based on AQI value"""
-        if aqi_value <= 50:
-            return "Air quality is satisfactory, and air pollution poses little or no risk."
-        elif aqi_value <= 100:
-            return "Air quality is acceptable. However, there may be a risk for some people."
-        elif aqi_value <= 150:
-            return "Members of sensitive groups may experience health effects."
-        elif aqi_value <= 200:
-            return "Everyone may begin to experience health effects."
-        elif aqi_value <= 300:
-            return "Health warnings of emergency conditions. Everyone is more likely to be affected."
-        else:
-            return "Health alert: everyone may experience more serious health effects."
+        return _ADVISORY_TABLE[aqi_table_index(aqi_value)]
 
 
 class AQIHistoryResponse(BaseModel):
@@ -75,3 +78,14 @@ class AQIHistoryResponse(BaseModel):
     total: int
     location_id: int
     city: str
+
+
+class AQIBatchFetchRequest(BaseModel):
+    """Schema for fetching fresh AQI data for several locations"""
+    location_ids: list[int] = Field(..., min_length=1, max_length=100)
+
+
+class AQIBatchFetchResponse(BaseModel):
+    """Schema for batch fetch results"""
+    readings: list[AQICurrentResponse]
+    failed_location_ids: list[int]
@@ -2,7 +2,7 @@
 Pydantic schemas for Location data validation
 """
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from datetime import datetime
 from typing import Optional
 
@@ -22,11 +22,10 @@ class LocationCreate(LocationBase):
 
 class LocationResponse(LocationBase):
     """Schema for location response"""
+    model_config = ConfigDict(from_attributes=True)
+    
     id: int
     created_at: datetime
-    
-    class Config:
-        from_attributes = True
 
 
 class LocationListResponse(BaseModel):
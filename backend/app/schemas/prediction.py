@@ -2,7 +2,7 @@
 Pydantic schemas for Prediction data validation
 """
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from datetime import datetime
 from typing import Optional
 
@@ -22,13 +22,12 @@ class PredictionCreate(PredictionBase):
 
 class PredictionResponse(PredictionBase):
     """Schema for prediction response"""
+    model_config = ConfigDict(from_attributes=True)
+    
     id: int
     location_id: int
     prediction_for: datetime
     created_at: datetime
-    
-    class Config:
-        from_attributes = True
 
 
 class PredictionListResponse(BaseModel):
@@ -48,6 +47,9 @@ class PredictionWithActual(BaseModel):
 
 class ModelInfoResponse(BaseModel):
     """Schema for model information"""
+    # model_version would otherwise clash with pydantic's "model_" namespace
+    model_config = ConfigDict(from_attributes=True, protected_namespaces=())
+    
     model_version: str
     best_c: float
     best_gamma: float
@@ -56,6 +58,3 @@ class ModelInfoResponse(BaseModel):
     trained_at: datetime
     generations_run: Optional[int]
     population_size: Optional[int]
-    
-    class Config:
-        from_attributes = True
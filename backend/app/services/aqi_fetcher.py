@@ -5,9 +5,13 @@ Integrates with OpenWeatherMap Air Pollution API and AQICN as backup
 
 import httpx
 import asyncio
-from datetime import datetime
-from typing import Optional, Dict, Any
+import numpy as np
+from bisect import bisect_left
+from cachetools import TTLCache
+from datetime import datetime, timezone
+from typing import Optional, Dict, Any, List, Tuple
 from app.config import settings
+from app.models.aqi_reading import aqi_category
 import logging
 
 logger = logging.getLogger(__name__)
@@ -85,34 +89,138 @@ class AQIFetcher:
     def __init__(self):
         self.owm_api_key = settings.OPENWEATHERMAP_API_KEY
         self.aqicn_token = settings.AQICN_API_TOKEN
+        self._client: Optional[httpx.AsyncClient] = None
+        # Shared by all batch fetches so concurrent jobs respect one cap
+        self._fetch_slots = asyncio.Semaphore(settings.MAX_CONCURRENT_FETCHES)
+        # Recent results per rounded (lat, lon). Entries live for half the
+        # collection interval, so every scheduled collection fetches fresh
+        # data while bursts of API requests in between share one fetch.
+        self._response_cache: TTLCache = TTLCache(
+            maxsize=1024, ttl=settings.DATA_FETCH_INTERVAL_MINUTES * 30
+        )
+        # Key -> in-flight fetch shared by concurrent callers
+        self._inflight: Dict[Tuple[float, float], asyncio.Task] = {}
+    
+    async def startup(self):
+        """Create the shared HTTP client (called from the app lifespan)"""
+        self._get_client()
+    
+    def _get_client(self) -> httpx.AsyncClient:
+        """
+        Shared HTTP client, created on startup or first use.
+        
+        Keeps connections (and TLS sessions) alive across requests and
+        multiplexes concurrent requests to the same host over HTTP/2.
+        """
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                http2=True,
+                timeout=10.0,
+                limits=httpx.Limits(
+                    max_connections=100,
+                    max_keepalive_connections=20,
+                    # Default of 5s drops idle connections between batches
+                    keepalive_expiry=60.0,
+                ),
+            )
+        return self._client
+    
+    async def close(self):
+        """Close the shared HTTP client"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+    
+    async def fetch_current_aqi_many(
+        self,
+        coords: List[Tuple[float, float]],
+        use_cache: bool = True
+    ) -> List[Optional[Dict[str, Any]]]:
+        """
+        Fetch current AQI data for many (latitude, longitude) pairs concurrently,
+        at most MAX_CONCURRENT_FETCHES at a time.
+        Results are in input order, with None where a fetch failed.
+        """
+        async def fetch_limited(latitude: float, longitude: float):
+            async with self._fetch_slots:
+                return await self.fetch_current_aqi(latitude, longitude, use_cache=use_cache)
+        
+        results = await asyncio.gather(
+            *(fetch_limited(latitude, longitude) for latitude, longitude in coords),
+            return_exceptions=True
+        )
+        
+        for i, result in enumerate(results):
+            if isinstance(result, Exception):
+                logger.error(f"AQI fetch failed for {coords[i]}: {result}")
+                results[i] = None
+        return results
         
     async def fetch_current_aqi(
         self, 
         latitude: float, 
-        longitude: float
+        longitude: float,
+        use_cache: bool = True
     ) -> Optional[Dict[str, Any]]:
         """
         Fetch current AQI data for given coordinates.
         Returns normalized AQI data dictionary.
+        
+        Results are cached briefly per location (coordinates rounded to
+        3 decimals, ~100 m) and concurrent misses share one request.
+        With use_cache=False a cached result is ignored, though the new
+        result still refreshes the cache.
         """
+        key = (round(latitude, 3), round(longitude, 3))
+        
+        if use_cache:
+            cached = self._response_cache.get(key)
+            if cached is not None:
+                return cached
+        
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._fetch_current_aqi_uncached(latitude, longitude))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        
+        # Shielded so one cancelled caller does not cancel the shared fetch
+        result = await asyncio.shield(task)
+        if result is not None:
+            self._response_cache[key] = result
+        return result
+    
+    async def _fetch_current_aqi_uncached(
+        self,
+        latitude: float,
+        longitude: float
+    ) -> Optional[Dict[str, Any]]:
+        """Fetch current AQI data from the external APIs"""
+        # Query OpenWeatherMap and AQICN (if configured) concurrently and
+        # use the first source that returns data, preferring OpenWeatherMap
+        # when both are ready together
+        owm_task = asyncio.create_task(self._fetch_from_owm(latitude, longitude))
+        pending = {owm_task}
+        if self.aqicn_token:
+            pending.add(asyncio.create_task(self._fetch_from_aqicn(latitude, longitude)))
+        
         try:
-            # Try OpenWeatherMap first
-            data = await self._fetch_from_owm(latitude, longitude)
-            if data:
-                return data
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
                 
-            # Fallback to AQICN if available
-            if self.aqicn_token:
-                data = await self._fetch_from_aqicn(latitude, longitude)
-                if data:
-                    return data
-                    
-            logger.warning(f"Failed to fetch AQI data for ({latitude}, {longitude})")
-            return None
+                for task in sorted(done, key=lambda t: t is not owm_task):
+                    if task.exception() is not None:
+                        logger.error(f"Error fetching AQI data: {task.exception()}")
+                    elif task.result():
+                        return task.result()
             
-        except Exception as e:
-            logger.error(f"Error fetching AQI data: {e}")
+            logger.warning("Failed to fetch AQI data for (%s, %s)", latitude, longitude)
             return None
+            
+        finally:
+            # Cancel the slower source once one has answered
+            for task in pending:
+                task.cancel()
     
     async def _fetch_from_owm(
         self, 
@@ -126,53 +234,53 @@ class AQIFetcher:
             
         url = f"{self.OWM_BASE_URL}?lat={latitude}&lon={longitude}&appid={self.owm_api_key}"
         
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.get(url, timeout=10.0)
-                response.raise_for_status()
-                data = response.json()
+        client = self._get_client()
+        try:
+            response = await client.get(url, timeout=10.0)
+            response.raise_for_status()
+            data = response.json()
                 
-                if "list" not in data or len(data["list"]) == 0:
-                    return None
+            if "list" not in data or len(data["list"]) == 0:
+                return None
                     
-                # Extract latest reading
-                reading = data["list"][0]
-                components = reading.get("components", {})
+            # Extract latest reading
+            reading = data["list"][0]
+            components = reading.get("components", {})
                 
-                # OpenWeatherMap provides concentrations in μg/m³
-                pm25 = components.get("pm2_5", 0)
-                pm10 = components.get("pm10", 0)
-                o3 = components.get("o3", 0)
-                no2 = components.get("no2", 0)
-                so2 = components.get("so2", 0)
-                co = components.get("co", 0)
+            # OpenWeatherMap provides concentrations in μg/m³
+            pm25 = components.get("pm2_5", 0)
+            pm10 = components.get("pm10", 0)
+            o3 = components.get("o3", 0)
+            no2 = components.get("no2", 0)
+            so2 = components.get("so2", 0)
+            co = components.get("co", 0)
                 
-                # Calculate AQI from PM2.5 (primary pollutant)
-                aqi_value = self._calculate_aqi(pm25, "pm25")
+            # Calculate AQI from PM2.5 (primary pollutant)
+            aqi_value = self._calculate_aqi(pm25, "pm25")
                 
-                # Get overall AQI considering all pollutants
-                aqi_values = [
-                    self._calculate_aqi(pm25, "pm25"),
-                    self._calculate_aqi(pm10, "pm10"),
-                ]
-                overall_aqi = max(aqi_values) if aqi_values else aqi_value
+            # Get overall AQI considering all pollutants
+            aqi_values = [
+                self._calculate_aqi(pm25, "pm25"),
+                self._calculate_aqi(pm10, "pm10"),
+            ]
+            overall_aqi = max(aqi_values) if aqi_values else aqi_value
                 
-                return {
-                    "pm25": pm25,
-                    "pm10": pm10,
-                    "o3": o3,
-                    "no2": no2,
-                    "so2": so2,
-                    "co": co,
-                    "aqi_value": overall_aqi,
-                    "aqi_category": self._get_category(overall_aqi),
-                    "recorded_at": datetime.fromtimestamp(reading.get("dt", datetime.now().timestamp())),
-                    "source": "openweathermap"
-                }
+            return {
+                "pm25": pm25,
+                "pm10": pm10,
+                "o3": o3,
+                "no2": no2,
+                "so2": so2,
+                "co": co,
+                "aqi_value": overall_aqi,
+                "aqi_category": self._get_category(overall_aqi),
+                "recorded_at": datetime.fromtimestamp(reading.get("dt", datetime.now(timezone.utc).timestamp()), tz=timezone.utc),
+                "source": "openweathermap"
+            }
                 
-            except httpx.HTTPError as e:
-                logger.error(f"OpenWeatherMap API error: {e}")
-                return None
+        except httpx.HTTPError as e:
+            logger.error(f"OpenWeatherMap API error: {e}")
+            return None
     
     async def _fetch_from_aqicn(
         self, 
@@ -185,67 +293,78 @@ class AQIFetcher:
             
         url = f"{self.AQICN_BASE_URL}/geo:{latitude};{longitude}/?token={self.aqicn_token}"
         
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.get(url, timeout=10.0)
-                response.raise_for_status()
-                data = response.json()
+        client = self._get_client()
+        try:
+            response = await client.get(url, timeout=10.0)
+            response.raise_for_status()
+            data = response.json()
                 
-                if data.get("status") != "ok":
-                    return None
+            if data.get("status") != "ok":
+                return None
                     
-                aqi_data = data.get("data", {})
-                iaqi = aqi_data.get("iaqi", {})
+            aqi_data = data.get("data", {})
+            iaqi = aqi_data.get("iaqi", {})
                 
-                return {
-                    "pm25": iaqi.get("pm25", {}).get("v"),
-                    "pm10": iaqi.get("pm10", {}).get("v"),
-                    "o3": iaqi.get("o3", {}).get("v"),
-                    "no2": iaqi.get("no2", {}).get("v"),
-                    "so2": iaqi.get("so2", {}).get("v"),
-                    "co": iaqi.get("co", {}).get("v"),
-                    "aqi_value": aqi_data.get("aqi", 0),
-                    "aqi_category": self._get_category(aqi_data.get("aqi", 0)),
-                    "recorded_at": datetime.now(),
-                    "source": "aqicn"
-                }
+            return {
+                "pm25": iaqi.get("pm25", {}).get("v"),
+                "pm10": iaqi.get("pm10", {}).get("v"),
+                "o3": iaqi.get("o3", {}).get("v"),
+                "no2": iaqi.get("no2", {}).get("v"),
+                "so2": iaqi.get("so2", {}).get("v"),
+                "co": iaqi.get("co", {}).get("v"),
+                "aqi_value": aqi_data.get("aqi", 0),
+                "aqi_category": self._get_category(aqi_data.get("aqi", 0)),
+                "recorded_at": datetime.now(timezone.utc),
+                "source": "aqicn"
+            }
                 
-            except httpx.HTTPError as e:
-                logger.error(f"AQICN API error: {e}")
-                return None
+        except httpx.HTTPError as e:
+            logger.error(f"AQICN API error: {e}")
+            return None
     
-    def _calculate_aqi(self, concentration: float, pollutant: str) -> int:
+    @staticmethod
+    def _calculate_aqi(concentration: float, pollutant: str) -> int:
         """
         Calculate AQI from pollutant concentration using EPA breakpoints.
         Formula: AQI = ((I_high - I_low) / (C_high - C_low)) * (C - C_low) + I_low
         """
-        if pollutant not in self.AQI_BREAKPOINTS:
+        table = _BREAKPOINT_TABLES.get(pollutant)
+        if table is None:
             return 0
-            
-        breakpoints = self.AQI_BREAKPOINTS[pollutant]
         
-        for c_low, c_high, i_low, i_high in breakpoints:
-            if c_low <= concentration <= c_high:
-                aqi = ((i_high - i_low) / (c_high - c_low)) * (concentration - c_low) + i_low
-                return round(aqi)
+        c_highs, c_lows, i_lows, slopes = table
+        
+        # Negative (invalid) concentrations count as 0, never below AQI 0
+        concentration = max(concentration, 0.0)
+        
+        # First segment whose upper bound covers the concentration
+        i = bisect_left(c_highs, concentration)
+        if i == len(c_highs):
+            # If concentration exceeds all breakpoints
+            return 500
         
-        # If concentration exceeds all breakpoints
-        return 500
+        return round(slopes[i] * (concentration - c_lows[i]) + i_lows[i])
+    
+    @staticmethod
+    def _calculate_aqi_many(concentrations: np.ndarray, pollutant: str) -> np.ndarray:
+        """Vectorized _calculate_aqi over an array of concentrations"""
+        table = _BREAKPOINT_ARRAYS.get(pollutant)
+        if table is None:
+            return np.zeros(len(concentrations), dtype=np.int64)
+        
+        c_highs, c_lows, i_lows, slopes = table
+        
+        concentrations = np.maximum(concentrations, 0.0)
+        idx = np.searchsorted(c_highs, concentrations, side="left")
+        above = idx == len(c_highs)
+        idx = np.minimum(idx, len(c_highs) - 1)
+        
+        aqi = np.round(slopes[idx] * (concentrations - c_lows[idx]) + i_lows[idx])
+        return np.where(above, 500, aqi).astype(np.int64)
     
     def _get_category(self, aqi_value: int) -> str:
         """Get AQI category from value"""
-        if aqi_value <= 50:
-            return "Good"
-        elif aqi_value <= 100:
-            return "Moderate"
-        elif aqi_value <= 150:
-            return "Unhealthy for Sensitive Groups"
-        elif aqi_value <= 200:
-            return "Unhealthy"
-        elif aqi_value <= 300:
-            return "Very Unhealthy"
-        else:
-            return "Hazardous"
+        return aqi_category(aqi_value)
     
     async def fetch_forecast(
         self, 
@@ -262,30 +381,63 @@ class AQIFetcher:
             
         url = f"{self.OWM_BASE_URL}/forecast?lat={latitude}&lon={longitude}&appid={self.owm_api_key}"
         
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.get(url, timeout=10.0)
-                response.raise_for_status()
-                data = response.json()
-                
-                forecasts = []
-                for reading in data.get("list", [])[:hours]:
-                    components = reading.get("components", {})
-                    pm25 = components.get("pm2_5", 0)
-                    aqi_value = self._calculate_aqi(pm25, "pm25")
-                    
-                    forecasts.append({
-                        "aqi_value": aqi_value,
-                        "aqi_category": self._get_category(aqi_value),
-                        "forecast_for": datetime.fromtimestamp(reading.get("dt")),
-                        "pm25": pm25,
-                    })
+        client = self._get_client()
+        try:
+            response = await client.get(url, timeout=10.0)
+            response.raise_for_status()
+            data = response.json()
                 
-                return forecasts
+            readings = data.get("list", [])[:hours]
+            pm25_values = np.fromiter(
+                (reading.get("components", {}).get("pm2_5", 0) for reading in readings),
+                dtype=np.float64,
+                count=len(readings)
+            )
+            aqi_values = self._calculate_aqi_many(pm25_values, "pm25")
+            
+            forecasts = [
+                {
+                    "aqi_value": aqi_value,
+                    "aqi_category": self._get_category(aqi_value),
+                    "forecast_for": datetime.fromtimestamp(reading.get("dt"), tz=timezone.utc),
+                    "pm25": pm25,
+                }
+                for reading, pm25, aqi_value in zip(readings, pm25_values.tolist(), aqi_values.tolist())
+            ]
+            
+            return forecasts
                 
-            except httpx.HTTPError as e:
-                logger.error(f"Forecast API error: {e}")
-                return None
+        except httpx.HTTPError as e:
+            logger.error(f"Forecast API error: {e}")
+            return None
+
+
+def _build_breakpoint_tables(breakpoints: Dict[str, list]) -> Dict[str, tuple]:
+    """
+    Split each pollutant's breakpoints into parallel tuples
+    (c_high, c_low, i_low, slope) so a segment is found with bisect.
+    """
+    return {
+        pollutant: (
+            tuple(c_high for _, c_high, _, _ in segments),
+            tuple(c_low for c_low, _, _, _ in segments),
+            tuple(i_low for _, _, i_low, _ in segments),
+            tuple(
+                (i_high - i_low) / (c_high - c_low)
+                for c_low, c_high, i_low, i_high in segments
+            ),
+        )
+        for pollutant, segments in breakpoints.items()
+    }
+
+
+_BREAKPOINT_TABLES = _build_breakpoint_tables(AQIFetcher.AQI_BREAKPOINTS)
+
+# The same tables as NumPy arrays, for batch conversion
+_BREAKPOINT_ARRAYS = {
+    pollutant: tuple(np.asarray(column, dtype=np.float64) for column in table)
+    for pollutant, table in _BREAKPOINT_TABLES.items()
+}
 
 
 # Singleton instance
@@ -0,0 +1,130 @@
+"""
+AQI Fetch Queue
+Redis Stream of pending fetch jobs, consumed by app.worker
+"""
+
+import logging
+
+from redis.asyncio import Redis
+
+from app.cache import get_redis
+
+logger = logging.getLogger(__name__)
+
+# Stream that API processes append fetch jobs to
+FETCH_STREAM = "aqi.fetch"
+
+# Consumer group shared by all worker processes
+FETCH_GROUP = "aqi-fetchers"
+
+# Cap on stream length; acknowledged jobs are trimmed approximately
+FETCH_STREAM_MAXLEN = 10000
+
+# Jobs delivered this many times without being acknowledged are moved to
+# the dead-letter stream instead of being retried again
+FETCH_MAX_DELIVERIES = 5
+FETCH_DEAD_LETTER_STREAM = "aqi.fetch.dead"
+
+
+class FetchQueue:
+    """
+    Producer/consumer helpers around the fetch-job Redis Stream.
+    
+    Disabled when REDIS_URL is not configured.
+    """
+    
+    @property
+    def enabled(self) -> bool:
+        return get_redis() is not None
+    
+    @property
+    def redis(self) -> Redis:
+        """Shared Redis client"""
+        return get_redis()
+    
+    async def enqueue(self, location_id: int) -> str:
+        """Append a fetch job for a location and return its job id"""
+        return await self.redis.xadd(
+            FETCH_STREAM,
+            {"location_id": location_id},
+            maxlen=FETCH_STREAM_MAXLEN,
+            approximate=True,
+        )
+    
+    async def ensure_group(self):
+        """Create the consumer group (and stream) if it does not exist yet"""
+        try:
+            await self.redis.xgroup_create(FETCH_STREAM, FETCH_GROUP, id="0", mkstream=True)
+        except Exception as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+    
+    async def read(self, consumer: str, count: int, block_ms: int) -> list[tuple[str, dict]]:
+        """
+        Read up to `count` new jobs for this consumer, waiting at most
+        `block_ms` for the first one. Returns (job_id, fields) pairs.
+        """
+        response = await self.redis.xreadgroup(
+            FETCH_GROUP,
+            consumer,
+            {FETCH_STREAM: ">"},
+            count=count,
+            block=block_ms,
+        )
+        if not response:
+            return []
+        _, entries = response[0]
+        return entries
+    
+    async def claim_stale(self, consumer: str, count: int, min_idle_ms: int) -> list[tuple[str, dict]]:
+        """
+        Take over up to `count` jobs delivered at least `min_idle_ms` ago
+        and never acknowledged, because their batch failed or their worker
+        died. Returns (job_id, fields) pairs like read(). Jobs already
+        delivered FETCH_MAX_DELIVERIES times are moved to the dead-letter
+        stream instead.
+        """
+        pending = await self.redis.xpending_range(
+            FETCH_STREAM, FETCH_GROUP, min="-", max="+", count=count, idle=min_idle_ms
+        )
+        if not pending:
+            return []
+        
+        deliveries = {entry["message_id"]: entry["times_delivered"] for entry in pending}
+        claimed = await self.redis.xclaim(
+            FETCH_STREAM, FETCH_GROUP, consumer, min_idle_time=min_idle_ms, message_ids=list(deliveries)
+        )
+        
+        jobs, dead = [], []
+        for job_id, fields in claimed:
+            if not fields:
+                # Trimmed from the stream meanwhile
+                continue
+            if deliveries[job_id] >= FETCH_MAX_DELIVERIES:
+                dead.append((job_id, fields))
+            else:
+                jobs.append((job_id, fields))
+        
+        if dead:
+            async with self.redis.pipeline(transaction=True) as pipe:
+                for job_id, fields in dead:
+                    pipe.xadd(
+                        FETCH_DEAD_LETTER_STREAM,
+                        {**fields, "job_id": job_id},
+                        maxlen=FETCH_STREAM_MAXLEN,
+                        approximate=True,
+                    )
+                pipe.xack(FETCH_STREAM, FETCH_GROUP, *(job_id for job_id, _ in dead))
+                await pipe.execute()
+            logger.warning(f"Moved {len(dead)} repeatedly failing fetch jobs to {FETCH_DEAD_LETTER_STREAM}")
+        
+        return jobs
+    
+    async def ack(self, job_ids: list[str]):
+        """Acknowledge processed jobs"""
+        if job_ids:
+            await self.redis.xack(FETCH_STREAM, FETCH_GROUP, *job_ids)
+
+
+# Singleton instance
+fetch_queue = FetchQueue()
@@ -0,0 +1,165 @@
+"""
+AQI Reading Store
+Bulk persistence helpers for fetched AQI readings
+"""
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import bindparam, func, select
+from sqlalchemy.exc import DBAPIError
+from datetime import datetime, timezone
+from typing import Dict, Any, Iterable, List, Optional
+import logging
+
+from app.cache import notify_new_readings
+from app.database import copy_records, insert_ignoring_conflicts
+from app.models import AQIReading
+
+logger = logging.getLogger(__name__)
+
+# Columns of a row produced by build_reading_row(), in COPY order
+READING_COLUMNS = (
+    "location_id",
+    "pm25",
+    "pm10",
+    "o3",
+    "no2",
+    "so2",
+    "co",
+    "aqi_value",
+    "aqi_category",
+    "recorded_at",
+)
+
+# Unique key of a reading; rows that repeat a stored key are skipped
+READING_KEY = ("location_id", "recorded_at")
+
+# Latest stored recorded_at per location, for the given location ids
+LATEST_RECORDED_STMT = (
+    select(AQIReading.location_id, func.max(AQIReading.recorded_at))
+    .where(AQIReading.location_id.in_(bindparam("location_ids", expanding=True)))
+    .group_by(AQIReading.location_id)
+)
+
+
+def build_reading_row(
+    location_id: int,
+    aqi_data: Dict[str, Any],
+    now: Optional[datetime] = None,
+) -> Dict[str, Any]:
+    """
+    Convert normalized fetcher output into an aqi_readings row.
+    
+    The category is always filled in here so reads never need to derive it.
+    Readings without a timestamp get `now`; batches pass one value for all
+    rows instead of reading the clock per row.
+    """
+    get = aqi_data.get
+    aqi_value = get("aqi_value", 0)
+    return {
+        "location_id": location_id,
+        "pm25": get("pm25"),
+        "pm10": get("pm10"),
+        "o3": get("o3"),
+        "no2": get("no2"),
+        "so2": get("so2"),
+        "co": get("co"),
+        "aqi_value": aqi_value,
+        "aqi_category": get("aqi_category") or AQIReading.get_category(aqi_value),
+        "recorded_at": get("recorded_at") or now or datetime.now(timezone.utc),
+    }
+
+
+def as_utc(value: datetime) -> datetime:
+    """Normalize a timestamp to aware UTC (SQLite returns naive values)"""
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+async def latest_recorded_at(db: AsyncSession, location_ids: Iterable[int]) -> Dict[int, datetime]:
+    """Latest stored recorded_at (aware UTC) per location; locations without readings are absent"""
+    result = await db.execute(LATEST_RECORDED_STMT, {"location_ids": list(location_ids)})
+    return {location_id: as_utc(recorded_at) for location_id, recorded_at in result}
+
+
+async def drop_stored_readings(db: AsyncSession, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Drop rows whose recorded_at equals the latest stored reading of their
+    location, i.e. the upstream API has not published a new measurement
+    since the last collection.
+    """
+    if not rows:
+        return rows
+    
+    latest = await latest_recorded_at(db, {row["location_id"] for row in rows})
+    
+    return [
+        row for row in rows
+        if latest.get(row["location_id"]) != as_utc(row["recorded_at"])
+    ]
+
+
+async def bulk_insert_readings(db: AsyncSession, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Insert many readings with a single executemany statement and commit.
+    
+    Skips the ORM unit of work entirely; rows are plain dicts as
+    produced by build_reading_row(). Rows repeating a stored
+    (location_id, recorded_at) are skipped.
+    
+    If the batch fails, rows are retried one by one under savepoints so a
+    bad row is dropped without losing the others; there is still a single
+    commit. Returns the rows that were actually inserted.
+    """
+    if not rows:
+        return rows
+    
+    stmt = (
+        insert_ignoring_conflicts(AQIReading.__table__, READING_KEY)
+        .returning(AQIReading.location_id, AQIReading.recorded_at)
+    )
+    try:
+        result = await db.execute(stmt, rows)
+        inserted = {(location_id, as_utc(recorded_at)) for location_id, recorded_at in result}
+    except DBAPIError as e:
+        logger.warning(f"Batch insert of {len(rows)} readings failed, retrying per row: {e}")
+        await db.rollback()
+        inserted = set()
+        for row in rows:
+            try:
+                async with db.begin_nested():
+                    result = await db.execute(stmt, row)
+                    if result.first():
+                        inserted.add((row["location_id"], as_utc(row["recorded_at"])))
+            except DBAPIError as e:
+                logger.error(f"Dropped reading for location {row['location_id']}: {e}")
+    
+    rows = [
+        row for row in rows
+        if (row["location_id"], as_utc(row["recorded_at"])) in inserted
+    ]
+    await db.commit()
+    if rows:
+        await notify_new_readings(*{row["location_id"] for row in rows})
+    return rows
+
+
+async def copy_readings(db: AsyncSession, rows: List[Dict[str, Any]]) -> None:
+    """
+    Bulk-load many readings with COPY (executemany off PostgreSQL) and commit.
+    
+    Rows are plain dicts as produced by build_reading_row(); rows
+    repeating a stored (location_id, recorded_at) are skipped.
+    """
+    if not rows:
+        return
+    
+    await copy_records(
+        db,
+        AQIReading.__table__,
+        READING_COLUMNS,
+        [tuple(row[column] for column in READING_COLUMNS) for row in rows],
+        conflict_columns=READING_KEY
+    )
+    await db.commit()
+    await notify_new_readings(*{row["location_id"] for row in rows})
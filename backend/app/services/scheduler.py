@@ -6,14 +6,52 @@ Handles periodic data collection and model retraining
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.interval import IntervalTrigger
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from datetime import datetime, timedelta
+from sqlalchemy import select, insert
+from collections import defaultdict, deque
+from datetime import datetime, timedelta, timezone
+from typing import Any, Deque, Dict
+import asyncio
 import logging
 
 from app.config import settings
-from app.database import async_session_maker
-from app.models import Location, AQIReading, Prediction
+from app.database import async_session_maker, insert_ignoring_conflicts
+from app.models import Location, Prediction
 from app.services.aqi_fetcher import aqi_fetcher
+from app.services.reading_store import (
+    as_utc,
+    build_reading_row,
+    bulk_insert_readings,
+    drop_stored_readings,
+    latest_recorded_at,
+)
+
+# Location fields the jobs need, selected as plain rows
+LOCATION_COLUMNS = (Location.id, Location.city, Location.latitude, Location.longitude)
+# Unique key of a location (uq_locations_coords)
+LOCATION_KEY = ("latitude", "longitude")
+
+# Statements run on every job, built once
+LOCATIONS_STMT = select(*LOCATION_COLUMNS)
+CREATE_DEFAULT_LOCATION_STMT = (
+    insert_ignoring_conflicts(Location.__table__, LOCATION_KEY)
+    .values(
+        city=settings.DEFAULT_CITY,
+        country=settings.DEFAULT_COUNTRY,
+        latitude=settings.DEFAULT_LATITUDE,
+        longitude=settings.DEFAULT_LONGITUDE,
+    )
+    .returning(*LOCATION_COLUMNS)
+)
+DEFAULT_LOCATION_STMT = LOCATIONS_STMT.where(
+    Location.latitude == settings.DEFAULT_LATITUDE,
+    Location.longitude == settings.DEFAULT_LONGITUDE,
+)
+
+# Locations predicted at once, each on its own session
+PREDICTION_CONCURRENCY = 4
+
+# Latest collected readings kept in memory per location for predictions
+RECENT_READINGS_PER_LOCATION = 168
 
 logger = logging.getLogger(__name__)
 
@@ -27,8 +65,19 @@ class SchedulerService:
     """
     
     def __init__(self):
-        self.scheduler = AsyncIOScheduler()
+        # A job never overlaps itself, and runs missed while it was busy
+        # (or while the loop was blocked) collapse into a single run
+        self.scheduler = AsyncIOScheduler(
+            job_defaults={"coalesce": True, "max_instances": 1}
+        )
         self._is_running = False
+        # Location id -> latest readings (oldest first), appended as they
+        # are collected so predictions need not query them back. A window
+        # whose newest reading is not the newest stored one (readings from
+        # API fetches or the worker) is refilled from the database.
+        self._recent: Dict[int, Deque[Dict[str, Any]]] = defaultdict(
+            lambda: deque(maxlen=RECENT_READINGS_PER_LOCATION)
+        )
         
     def start(self):
         """Start the scheduler with configured jobs"""
@@ -42,6 +91,7 @@ class SchedulerService:
             id="collect_aqi_data",
             name="Collect AQI Data",
             replace_existing=True,
+            misfire_grace_time=settings.DATA_FETCH_INTERVAL_MINUTES * 60,
         )
         
         # Add model retraining job
@@ -51,6 +101,7 @@ class SchedulerService:
             id="retrain_model",
             name="Retrain GA-KELM Model",
             replace_existing=True,
+            misfire_grace_time=settings.MODEL_RETRAIN_INTERVAL_HOURS * 3600,
         )
         
         # Add prediction generation job (every hour)
@@ -60,6 +111,7 @@ class SchedulerService:
             id="generate_predictions",
             name="Generate Predictions",
             replace_existing=True,
+            misfire_grace_time=3600,
         )
         
         self.scheduler.start()
@@ -83,53 +135,43 @@ class SchedulerService:
         async with async_session_maker() as session:
             try:
                 # Get all monitored locations
-                result = await session.execute(select(Location))
-                locations = result.scalars().all()
+                result = await session.execute(LOCATIONS_STMT)
+                locations = result.all()
                 
                 if not locations:
                     logger.info("No locations to monitor, creating default location")
-                    # Create default location if none exist
-                    default_location = Location(
-                        city=settings.DEFAULT_CITY,
-                        country=settings.DEFAULT_COUNTRY,
-                        latitude=settings.DEFAULT_LATITUDE,
-                        longitude=settings.DEFAULT_LONGITUDE,
-                    )
-                    session.add(default_location)
+                    # Create default location if none exist; a concurrent run
+                    # inserting the same coordinates wins and is read back
+                    result = await session.execute(CREATE_DEFAULT_LOCATION_STMT)
+                    locations = result.all()
+                    if not locations:
+                        result = await session.execute(DEFAULT_LOCATION_STMT)
+                        locations = result.all()
                     await session.commit()
-                    locations = [default_location]
                 
-                # Fetch and store AQI data for each location
-                for location in locations:
-                    try:
-                        aqi_data = await aqi_fetcher.fetch_current_aqi(
-                            location.latitude, 
-                            location.longitude
-                        )
-                        
-                        if aqi_data:
-                            reading = AQIReading(
-                                location_id=location.id,
-                                pm25=aqi_data.get("pm25"),
-                                pm10=aqi_data.get("pm10"),
-                                o3=aqi_data.get("o3"),
-                                no2=aqi_data.get("no2"),
-                                so2=aqi_data.get("so2"),
-                                co=aqi_data.get("co"),
-                                aqi_value=aqi_data.get("aqi_value", 0),
-                                aqi_category=aqi_data.get("aqi_category"),
-                                recorded_at=aqi_data.get("recorded_at", datetime.now()),
-                            )
-                            session.add(reading)
-                            logger.info(f"Collected AQI data for {location.city}: AQI={reading.aqi_value}")
-                        else:
-                            logger.warning(f"No AQI data available for {location.city}")
-                            
-                    except Exception as e:
-                        logger.error(f"Error collecting data for {location.city}: {e}")
-                        continue
+                # Fetch AQI data for all locations concurrently, then store
+                results = await aqi_fetcher.fetch_current_aqi_many(
+                    [(location.latitude, location.longitude) for location in locations]
+                )
                 
-                await session.commit()
+                rows = []
+                now = datetime.now(timezone.utc)
+                for location, aqi_data in zip(locations, results):
+                    if aqi_data:
+                        row = build_reading_row(location.id, aqi_data, now)
+                        rows.append(row)
+                        logger.info("Collected AQI data for %s: AQI=%s", location.city, row["aqi_value"])
+                    else:
+                        logger.warning("No AQI data available for %s", location.city)
+                
+                # Skip measurements that are already stored
+                new_rows = await drop_stored_readings(session, rows)
+                if len(new_rows) < len(rows):
+                    logger.info(f"Skipped {len(rows) - len(new_rows)} unchanged readings")
+                
+                new_rows = await bulk_insert_readings(session, new_rows)
+                for row in new_rows:
+                    self._recent[row["location_id"]].append(row)
                 logger.info("AQI data collection completed")
                 
             except Exception as e:
@@ -149,20 +191,17 @@ class SchedulerService:
             
             async with async_session_maker() as session:
                 # Get training data from last 30 days
-                cutoff_date = datetime.now() - timedelta(days=30)
-                result = await session.execute(
-                    select(AQIReading)
-                    .where(AQIReading.recorded_at >= cutoff_date)
-                    .order_by(AQIReading.recorded_at)
+                cutoff_date = datetime.now(timezone.utc) - timedelta(days=30)
+                aqi_values, time_features, pollution = await predictor_service._fetch_training_arrays(
+                    session, since=cutoff_date
                 )
-                readings = result.scalars().all()
                 
-                if len(readings) < 100:
+                if len(aqi_values) < 100:
                     logger.warning("Not enough data for retraining (need at least 100 samples)")
                     return
                 
                 # Retrain model
-                await predictor_service.train_model(readings, session)
+                await predictor_service.train_model(aqi_values, time_features, pollution, session)
                 logger.info("Model retraining completed")
                 
         except Exception as e:
@@ -180,30 +219,55 @@ class SchedulerService:
             
             async with async_session_maker() as session:
                 # Get all locations
-                result = await session.execute(select(Location))
-                locations = result.scalars().all()
+                result = await session.execute(LOCATIONS_STMT)
+                locations = result.all()
+                
+                # Forget windows of deleted locations
+                location_ids = {location.id for location in locations}
+                for location_id in self._recent.keys() - location_ids:
+                    del self._recent[location_id]
                 
-                for location in locations:
+                # Empty stale windows so predict_future refills them
+                latest = await latest_recorded_at(session, location_ids)
+                for location_id, window in self._recent.items():
+                    if window and as_utc(window[-1]["recorded_at"]) != latest.get(location_id):
+                        window.clear()
+                
+                # Load the model once here rather than racing to in every task
+                if not predictor_service._is_loaded:
+                    await predictor_service.load_latest_model(session)
+            
+            slots = asyncio.Semaphore(PREDICTION_CONCURRENCY)
+            
+            async def predict_location(location) -> list:
+                # Sessions are not shared between concurrent tasks
+                async with slots, async_session_maker() as task_session:
                     try:
                         # Generate predictions for next 24 hours
                         predictions = await predictor_service.predict_future(
                             location_id=location.id,
                             hours_ahead=24,
-                            session=session
+                            session=task_session,
+                            recent=self._recent[location.id]
                         )
-                        
-                        if predictions:
-                            for pred in predictions:
-                                session.add(pred)
-                            
-                            logger.info(f"Generated {len(predictions)} predictions for {location.city}")
-                            
                     except Exception as e:
                         logger.error(f"Error generating predictions for {location.city}: {e}")
-                        continue
+                        return []
                 
-                await session.commit()
-                logger.info("Prediction generation completed")
+                if predictions:
+                    logger.info("Generated %d predictions for %s", len(predictions), location.city)
+                return predictions
+            
+            results = await asyncio.gather(*(predict_location(location) for location in locations))
+            
+            # Rows for all locations, inserted with one executemany
+            prediction_rows = [row for predictions in results for row in predictions]
+            
+            if prediction_rows:
+                async with async_session_maker() as session:
+                    await session.execute(insert(Prediction), prediction_rows)
+                    await session.commit()
+            logger.info("Prediction generation completed")
                 
         except Exception as e:
             logger.error(f"Error in prediction generation: {e}")
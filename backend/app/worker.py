@@ -0,0 +1,132 @@
+"""
+AQI Fetch Worker
+
+Consumes fetch jobs from the Redis Stream filled by
+POST /api/v1/aqi/fetch/{location_id}/enqueue. Jobs are buffered into
+batches: locations in a batch are fetched concurrently and their
+readings are written with a single COPY.
+
+Run with: python -m app.worker
+"""
+
+import asyncio
+import logging
+import os
+import socket
+import sys
+from datetime import datetime, timezone
+
+from sqlalchemy import select
+
+from app.cache import close_redis
+from app.config import settings
+from app.database import async_session_maker, close_db
+from app.models import Location
+from app.services.aqi_fetcher import aqi_fetcher
+from app.services.fetch_queue import fetch_queue
+from app.services.reading_store import build_reading_row, copy_readings
+
+logging.basicConfig(
+    level=logging.INFO if not settings.DEBUG else logging.DEBUG,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    handlers=[
+        logging.StreamHandler(sys.stdout)
+    ]
+)
+logger = logging.getLogger(__name__)
+
+# Flush a batch after this many jobs, or after waiting this long for more
+BATCH_SIZE = 100
+BATCH_WAIT_MS = 2000
+
+# Unacknowledged jobs idle this long are retried; well above the time a
+# batch takes, so jobs still being processed by a live worker are left alone
+RECLAIM_IDLE_MS = 60000
+# How often to look for such jobs while the pending list is drained
+RECLAIM_INTERVAL_SECONDS = 30
+
+
+async def process_batch(location_ids: list[int]) -> int:
+    """Fetch and store readings for a batch of locations; returns rows stored"""
+    async with async_session_maker() as session:
+        result = await session.execute(
+            select(Location.id, Location.latitude, Location.longitude)
+            .where(Location.id.in_(location_ids))
+        )
+        locations = result.all()
+    
+    results = await aqi_fetcher.fetch_current_aqi_many(
+        [(location.latitude, location.longitude) for location in locations],
+        use_cache=False
+    )
+    now = datetime.now(timezone.utc)
+    rows = [
+        build_reading_row(location.id, aqi_data, now)
+        for location, aqi_data in zip(locations, results)
+        if aqi_data
+    ]
+    
+    async with async_session_maker() as session:
+        await copy_readings(session, rows)
+    
+    return len(rows)
+
+
+async def run(consumer: str):
+    """Consume fetch jobs until cancelled"""
+    await fetch_queue.ensure_group()
+    logger.info(f"Fetch worker {consumer} started")
+    
+    loop = asyncio.get_running_loop()
+    next_reclaim = loop.time()
+    
+    while True:
+        # Failed or abandoned jobs first, then new ones
+        jobs = []
+        if loop.time() >= next_reclaim:
+            jobs = await fetch_queue.claim_stale(consumer, count=BATCH_SIZE, min_idle_ms=RECLAIM_IDLE_MS)
+            if len(jobs) < BATCH_SIZE:
+                next_reclaim = loop.time() + RECLAIM_INTERVAL_SECONDS
+        if not jobs:
+            jobs = await fetch_queue.read(consumer, count=BATCH_SIZE, block_ms=BATCH_WAIT_MS)
+        if not jobs:
+            continue
+        
+        # Coalesce duplicate requests for the same location
+        location_ids = list(dict.fromkeys(int(fields["location_id"]) for _, fields in jobs))
+        
+        try:
+            stored = await process_batch(location_ids)
+            logger.info(f"Stored {stored} readings for {len(location_ids)} locations")
+        except Exception as e:
+            # Unacknowledged jobs stay pending and are reclaimed once idle
+            logger.error(f"Error processing fetch batch: {e}")
+            continue
+        
+        await fetch_queue.ack([job_id for job_id, _ in jobs])
+
+
+async def main():
+    if not fetch_queue.enabled:
+        logger.error("REDIS_URL is not configured; nothing to consume")
+        return
+    
+    try:
+        # Unique per process, so workers scaled on one host keep separate
+        # pending lists
+        await run(consumer=f"{socket.gethostname()}-{os.getpid()}")
+    finally:
+        await close_redis()
+        await aqi_fetcher.close()
+        await close_db()
+
+
+if __name__ == "__main__":
+    # uvloop ships with uvicorn[standard] (not on Windows)
+    try:
+        import uvloop
+        uvloop.install()
+    except ImportError:
+        pass
+    
+    asyncio.run(main())
@@ -6,6 +6,29 @@
 const API_BASE = import.meta.env.VITE_API_URL || '';
 const WS_BASE = import.meta.env.VITE_WS_URL || `ws://${window.location.host}`;
 
+// WebSocket messages arrive as binary frames of UTF-8 JSON; large ones
+// are zlib-compressed by the server and start with a flag byte
+const wsDecoder = new TextDecoder();
+const WS_COMPRESSED_FLAG = 0x01;
+
+/**
+ * Decode a WebSocket message into its JSON payload
+ */
+async function decodeWsMessage(data) {
+    if (typeof data === 'string') {
+        return JSON.parse(data);
+    }
+
+    let bytes = new Uint8Array(data);
+    if (bytes[0] === WS_COMPRESSED_FLAG) {
+        const stream = new Blob([bytes.subarray(1)])
+            .stream()
+            .pipeThrough(new DecompressionStream('deflate'));
+        bytes = new Uint8Array(await new Response(stream).arrayBuffer());
+    }
+    return JSON.parse(wsDecoder.decode(bytes));
+}
+
 /**
  * Make an API request
  */
@@ -110,6 +133,8 @@ export class AQIWebSocket {
         this.reconnectAttempts = 0;
         this.maxReconnectAttempts = 5;
         this.reconnectDelay = 1000;
+        // Decoding is async; messages are handled in arrival order
+        this.pendingMessages = Promise.resolve();
     }
 
     connect() {
@@ -117,6 +142,7 @@ export class AQIWebSocket {
 
         try {
             this.ws = new WebSocket(url);
+            this.ws.binaryType = 'arraybuffer';
 
             this.ws.onopen = () => {
                 console.log(`WebSocket connected for location ${this.locationId}`);
@@ -125,28 +151,9 @@ export class AQIWebSocket {
             };
 
             this.ws.onmessage = (event) => {
-                try {
-                    const data = JSON.parse(event.data);
-
-                    switch (data.type) {
-                        case 'update':
-                            this.callbacks.onUpdate?.(data);
-                            break;
-                        case 'ping':
-                            this.send({ type: 'pong' });
-                            break;
-                        case 'pong':
-                            // Keep-alive response
-                            break;
-                        case 'error':
-                            this.callbacks.onError?.(new Error(data.message));
-                            break;
-                        default:
-                            console.log('Unknown message type:', data.type);
-                    }
-                } catch (error) {
-                    console.error('WebSocket message parse error:', error);
-                }
+                this.pendingMessages = this.pendingMessages.then(
+                    () => this.handleMessage(event.data)
+                );
             };
 
             this.ws.onclose = (event) => {
@@ -173,6 +180,31 @@ export class AQIWebSocket {
         }
     }
 
+    async handleMessage(raw) {
+        try {
+            const data = await decodeWsMessage(raw);
+
+            switch (data.type) {
+                case 'update':
+                    this.callbacks.onUpdate?.(data);
+                    break;
+                case 'ping':
+                    this.send({ type: 'pong' });
+                    break;
+                case 'pong':
+                    // Keep-alive response
+                    break;
+                case 'error':
+                    this.callbacks.onError?.(new Error(data.message));
+                    break;
+                default:
+                    console.log('Unknown message type:', data.type);
+            }
+        } catch (error) {
+            console.error('WebSocket message parse error:', error);
+        }
+    }
+
     send(data) {
         if (this.ws?.readyState === WebSocket.OPEN) {
             this.ws.send(JSON.stringify(data));